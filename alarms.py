@@ -0,0 +1,220 @@
+"""Pressure alarms evaluated in the acquisition loop.
+
+The collector calls AlarmEngine.check() with every sample right after it
+is read, so alarms do not depend on the CSV log or on any viewer. A check
+is a few comparisons per rule (dP/dt rules add an O(1) rolling update);
+the actions run on a background thread.
+
+Rules are configured per controller address in a JSON file:
+
+    {
+      "actions": {"log": "alarms.log", "hook": "./notify.sh", "socket": true},
+      "rules": {
+        "*":  [{"name": "high", "above": 1e-5, "clear": 8e-6, "debounce": 3}],
+        "05": [{"name": "high", "above": 5e-5, "clear": 4e-5},
+               {"name": "rise", "metric": "dpdt", "above": 1e-8, "window": 30}]
+      }
+    }
+
+"*" applies to addresses without their own list. A rule raises after
+`debounce` consecutive samples beyond `above` (or `below`) and clears
+after `clear_debounce` samples back past `clear` (hysteresis, default is
+the limit itself). Every raise/clear is written to the log, passed to the
+hook (environment variables SPCE_ALARM_*) and sent as a JSON line to
+subscribers of ALARM_ADDRESS.
+"""
+import json
+import os
+import queue
+import shlex
+import subprocess
+import threading
+
+from metrics import counter
+from pressure_bus import ALARM_ADDRESS, BusPublisher
+from pressure_io import format_timestamp
+from pressure_stats import RollingWindow
+
+
+ALARM_EVENTS = counter("alarm_events_total", "Alarms raised and cleared", ["addr", "rule", "event"])
+ACTION_ERRORS = counter("alarm_action_errors_total", "Failed alarm actions", ["action"])
+
+RULE_KEYS = {"name", "metric", "above", "below", "clear", "debounce", "clear_debounce", "window"}
+
+
+class AlarmRule:
+    """Threshold with hysteresis and debounce on the pressure or on dP/dt"""
+
+    def __init__(self, name: str, above: float = None, below: float = None, clear: float = None,
+                 debounce: int = 1, clear_debounce: int = None, metric: str = "pressure",
+                 window: float = 30.0):
+        if (above is None) == (below is None):
+            raise ValueError(f"Alarm rule {name!r} needs exactly one of 'above' or 'below'")
+        if metric not in ("pressure", "dpdt"):
+            raise ValueError(f"Alarm rule {name!r}: metric must be 'pressure' or 'dpdt', got {metric!r}")
+        self.name = name
+        self.metric = metric
+        self.above = above
+        self.below = below
+        limit = above if above is not None else below
+        self.clear = limit if clear is None else clear
+        self.debounce = max(1, debounce)
+        self.clear_debounce = self.debounce if clear_debounce is None else max(1, clear_debounce)
+        self.window = window
+        self.active = False
+        self._count = 0
+        # dP/dt průběžně z klouzavého okna, O(1) na vzorek
+        self._rate = RollingWindow(window) if metric == "dpdt" else None
+
+    @classmethod
+    def from_spec(cls, spec: dict):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"Unknown alarm rule keys {sorted(unknown)} in {spec}")
+        return cls(**spec)
+
+    def update(self, t: float, p: float):
+        """Feed one sample, returns ("raised" | "cleared", value) on a change, else None"""
+        if self._rate is not None:
+            self._rate.add(t, p)
+            value = self._rate.dpdt
+            if value is None:
+                return None
+        else:
+            value = p
+
+        if self.active:
+            back = value < self.clear if self.above is not None else value > self.clear
+            self._count = self._count + 1 if back else 0
+            if self._count >= self.clear_debounce:
+                self.active = False
+                self._count = 0
+                return "cleared", value
+        else:
+            beyond = value > self.above if self.above is not None else value < self.below
+            self._count = self._count + 1 if beyond else 0
+            if self._count >= self.debounce:
+                self.active = True
+                self._count = 0
+                return "raised", value
+        return None
+
+
+class LogAction:
+    """Appends one line per alarm event to a text file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, event: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{format_timestamp(event['time'])} {event['addr']} {event['rule']} {event['event']} "
+                    f"value={event['value']:.3e} pressure={event['pressure']:.3e}\n")
+
+
+class HookAction:
+    """Starts a command for every alarm event (does not wait for it)"""
+
+    def __init__(self, command: str):
+        self.args = shlex.split(command, posix=os.name != "nt")
+        self._running = []
+
+    def __call__(self, event: dict):
+        env = dict(os.environ)
+        env.update({f"SPCE_ALARM_{key.upper()}": str(value) for key, value in event.items()})
+        # Dokončené procesy uklidit, ať nezůstávají zombie
+        self._running = [p for p in self._running if p.poll() is None]
+        self._running.append(subprocess.Popen(self.args, env=env))
+
+
+class SocketAction:
+    """Sends every alarm event as a JSON line to local subscribers"""
+
+    def __init__(self, address=ALARM_ADDRESS):
+        self.publisher = BusPublisher(address)
+
+    def __call__(self, event: dict):
+        self.publisher.publish_line((json.dumps(event) + "\n").encode("utf-8"))
+
+    def close(self):
+        self.publisher.close()
+
+
+class AlarmEngine:
+    """Evaluates the rules of each controller address on every sample.
+
+    check() is meant for the acquisition loop: it only updates the rule
+    states and queues events; actions run on the "alarm-actions" thread.
+    """
+
+    def __init__(self, specs: dict, actions=()):
+        self.specs = specs
+        self.actions = list(actions)
+        self.events = 0
+        self._rules = {}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="alarm-actions", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, path: str):
+        """Engine with the rules and actions of a JSON config file"""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        specs = {key.upper(): rules for key, rules in config.get("rules", {}).items()}
+        # Chyby v pravidlech hned při startu, ne až u prvního vzorku
+        for rules in specs.values():
+            for spec in rules:
+                AlarmRule.from_spec(spec)
+
+        actions = []
+        settings = config.get("actions", {})
+        if settings.get("log"):
+            actions.append(LogAction(settings["log"]))
+        if settings.get("hook"):
+            actions.append(HookAction(settings["hook"]))
+        if settings.get("socket"):
+            actions.append(SocketAction() if settings["socket"] is True else SocketAction(settings["socket"]))
+        return cls(specs, actions)
+
+    def rules(self, addr: str) -> list:
+        if addr not in self._rules:
+            specs = self.specs.get(addr, self.specs.get("*", []))
+            self._rules[addr] = [AlarmRule.from_spec(spec) for spec in specs]
+        return self._rules[addr]
+
+    def check(self, addr: int, t: float, p: float):
+        """Evaluate one sample of controller `addr`"""
+        key = f"{addr:02X}"
+        for rule in self.rules(key):
+            change = rule.update(t, p)
+            if change is not None:
+                event, value = change
+                self.events += 1
+                ALARM_EVENTS.inc(addr=key, rule=rule.name, event=event)
+                self._queue.put(dict(time=t, addr=key, rule=rule.name, event=event, value=value, pressure=p))
+
+    def active(self) -> list:
+        """(addr, rule name) of the alarms currently raised"""
+        return [(addr, rule.name) for addr, rules in self._rules.items() for rule in rules if rule.active]
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                break
+            print(f"ALARM {event['addr']} {event['rule']} {event['event']}: {event['value']:.3e}")
+            for action in self.actions:
+                try:
+                    action(event)
+                except Exception as e:
+                    ACTION_ERRORS.inc(action=type(action).__name__)
+                    print(f"Alarm action {type(action).__name__} failed: {e}")
+
+    def close(self):
+        """Run the queued actions and stop the action thread"""
+        self._queue.put(None)
+        self._thread.join(5)
+        for action in self.actions:
+            if hasattr(action, "close"):
+                action.close()
@@ -1,10 +1,38 @@
 import sys
-import csv
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                             QPushButton, QFileDialog, QLabel)
+import numpy as np
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                             QPushButton, QFileDialog, QLabel, QProgressBar)
 from PyQt5.QtCore import Qt
 import pyqtgraph as pg
 
+from log_index import read_log
+from pressure_io import format_local_times, nearest_index
+from pyramid import PressurePyramid, sidecar_path
+from qt_loader import LoadTask
+
+# Draw point symbols only when few points are visible
+MAX_SYMBOL_POINTS = 2000
+
+
+def load_log(file_path, progress=None, cancelled=None):
+    """Parse the CSV and prepare its pyramid (runs in a pool thread)"""
+    # Bulk parse; x axis is the sample index, timestamps are kept for labels.
+    # A rotated log is read segment by segment, compressed segments included
+    timestamps, pressures, bad_rows = read_log(file_path, progress=progress, cancelled=cancelled)
+    index = np.arange(len(timestamps), dtype=np.float64)
+
+    # Min/max pyramid saved beside the CSV, rebuilt if it does not match
+    pyramid_path = sidecar_path(file_path, x="index")
+    pyramid = PressurePyramid.load(pyramid_path) or PressurePyramid()
+    count = pyramid.count
+    pyramid.sync(index, pressures)
+    if pyramid.count != count and len(index):
+        try:
+            pyramid.save(pyramid_path)
+        except OSError as e:
+            print(f"Error saving pyramid: {e}")
+    return file_path, timestamps, index, pressures, bad_rows, pyramid
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -30,6 +58,18 @@ class MainWindow(QMainWindow):
         self.load_btn.clicked.connect(self.load_csv)
         layout.addWidget(self.load_btn)
 
+        # Progress of a background load, with a cancel button
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.cancel_load)
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_btn)
+        layout.addLayout(progress_layout)
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+
         # Create plot widget
         self.plot_widget = pg.PlotWidget()
         layout.addWidget(self.plot_widget)
@@ -49,111 +89,162 @@ class MainWindow(QMainWindow):
         # Data storage for crosshair
         self.time_data = []
         self.pressure_data = []
-        self.time_labels = []
+        self.timestamps = []
+        self.pyramid = None
+        self.curve = None
+        self.updating_view = False
+        self.load_task = None
 
         # Connect mouse click event
         self.plot_widget.scene().sigMouseClicked.connect(self.mouse_clicked)
+        self.plot_widget.sigXRangeChanged.connect(self.update_view)
 
     def load_csv(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select CSV File", "", "CSV Files (*.csv);;All Files (*)"
+            self, "Select CSV File", "", "CSV Files (*.csv *.csv.gz *.csv.zst);;All Files (*)"
         )
 
         if file_path:
-            try:
-                self.time_data = []
-                self.pressure_data = []
-                self.time_labels = []
-
-                with open(file_path, 'r') as file:
-                    csv_reader = csv.reader(file)
-                    headers = next(csv_reader)  # Read headers
-
-                    for i, row in enumerate(csv_reader):
-                        if len(row) >= 2:
-                            try:
-                                # Parse pressure
-                                pressure = float(row[0])
-                                self.pressure_data.append(pressure)
-
-                                # Store time string for labels
-                                self.time_labels.append(row[1])
-
-                                # Use index for x-axis positioning
-                                self.time_data.append(i)
-
-                            except ValueError:
-                                continue
-
-                if self.time_data and self.pressure_data:
-                    # Clear previous plot
-                    self.plot_widget.clear()
-
-                    # Create crosshair elements after clearing
-                    self.vLine = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('w', width=1))
-                    self.hLine = pg.InfiniteLine(angle=0, movable=False, pen=pg.mkPen('w', width=1))
-                    self.crosshair_label = pg.TextItem(anchor=(0, 1), color='w')
-
-                    self.plot_widget.addItem(self.vLine, ignoreBounds=True)
-                    self.plot_widget.addItem(self.hLine, ignoreBounds=True)
-                    self.plot_widget.addItem(self.crosshair_label)
-
-                    # Hide crosshair initially
-                    self.vLine.setVisible(False)
-                    self.hLine.setVisible(False)
-                    self.crosshair_label.setVisible(False)
-                    self.crosshair_visible = False
-
-                    # Plot the data
-                    self.plot_widget.plot(
-                        self.time_data,
-                        self.pressure_data,
-                        pen=pg.mkPen(color='orange', width=2),
-                        symbol='o',
-                        symbolPen='orange',
-                        symbolBrush='orange',
-                        symbolSize=6
-                    )
+            # Parse in the background, the window stays responsive
+            self.cancel_load()
+            task = LoadTask(load_log, file_path)
+            task.signals.progress.connect(self.load_progress)
+            task.signals.finished.connect(lambda result, task=task: self.csv_loaded(task, result))
+            task.signals.failed.connect(lambda error, task=task: self.load_failed(task, error))
+            task.signals.cancelled.connect(lambda task=task: self.load_finished(task))
+            self.load_task = task.start()
+
+            self.info_label.setText(f"Loading {file_path.split('/')[-1]}...")
+            self.progress_bar.setValue(0)
+            self.progress_bar.show()
+            self.cancel_btn.show()
+
+    def cancel_load(self):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_finished(self.load_task)
+            self.info_label.setText("Loading cancelled")
+
+    def load_progress(self, done, total):
+        if self.load_task is not None and total:
+            self.progress_bar.setValue(int(100 * done / total))
+
+    def load_finished(self, task):
+        """Hide the progress bar; returns False for results of an older load"""
+        if task is not self.load_task:
+            return False
+        self.load_task = None
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+        return True
+
+    def load_failed(self, task, error):
+        if self.load_finished(task):
+            self.info_label.setText(f"Error loading CSV: {str(error)}")
+
+    def csv_loaded(self, task, result):
+        """Plot a parsed file (called in the GUI thread)"""
+        if not self.load_finished(task):
+            return
+        file_path, timestamps, time_data, pressure_data, bad_rows, pyramid = result
+
+        try:
+            self.timestamps = timestamps
+            self.time_data = time_data
+            self.pressure_data = pressure_data
+
+            if len(self.time_data):
+                self.pyramid = pyramid
+
+                # Clear previous plot
+                self.plot_widget.clear()
+
+                # Create crosshair elements after clearing
+                self.vLine = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('w', width=1))
+                self.hLine = pg.InfiniteLine(angle=0, movable=False, pen=pg.mkPen('w', width=1))
+                self.crosshair_label = pg.TextItem(anchor=(0, 1), color='w')
+
+                self.plot_widget.addItem(self.vLine, ignoreBounds=True)
+                self.plot_widget.addItem(self.hLine, ignoreBounds=True)
+                self.plot_widget.addItem(self.crosshair_label)
+
+                # Hide crosshair initially
+                self.vLine.setVisible(False)
+                self.hLine.setVisible(False)
+                self.crosshair_label.setVisible(False)
+                self.crosshair_visible = False
+
+                # Plot the data (update_view fills in the visible part)
+                self.curve = self.plot_widget.plot(
+                    pen=pg.mkPen(color='orange', width=2),
+                    symbolPen='orange',
+                    symbolBrush='orange',
+                    symbolSize=6
+                )
+
+                # Set up custom x-axis labels with time strings
+                # Show every nth label to avoid overcrowding
+                step = max(1, len(self.timestamps) // 10)
+                positions = np.arange(0, len(self.timestamps), step)
+                ticks = list(zip(positions.tolist(),
+                                 format_local_times(self.timestamps[positions]).tolist()))
+
+                ax = self.plot_widget.getAxis('bottom')
+                ax.setTicks([ticks])
+
+                # Disable auto SI prefix and format as scientific notation
+                left_axis = self.plot_widget.getAxis('left')
+                left_axis.enableAutoSIPrefix(False)
+
+                # Override the tick string method to show scientific notation
+                class ScientificAxis(pg.AxisItem):
+                    def tickStrings(self, values, scale, spacing):
+                        return [f'{val:.1e}' for val in values]
+
+                # Replace the left axis
+                self.plot_widget.setAxisItems({'left': ScientificAxis(orientation='left')})
+
+                # Update window title and info
+                self.plot_widget.setTitle(f'Data from {file_path.split("/")[-1]}')
+                info = f"Loaded {len(self.pressure_data)} data points from {file_path.split('/')[-1]}"
+                if bad_rows:
+                    info += f" ({bad_rows} invalid rows skipped)"
+                self.info_label.setText(info)
+
+                # Set ranges
+                self.plot_widget.setXRange(0, len(self.time_data) - 1)
+                self.update_view()
+                if len(self.pressure_data):
+                    min_pressure = float(self.pressure_data.min())
+                    max_pressure = float(self.pressure_data.max())
+                    margin = (max_pressure - min_pressure) * 0.1
+                    self.plot_widget.setYRange(min_pressure - margin, max_pressure + margin)
+            else:
+                self.info_label.setText("No valid data found in CSV")
+
+        except Exception as e:
+            self.info_label.setText(f"Error loading CSV: {str(e)}")
+
+    def closeEvent(self, event):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_task.done.wait(5)
+        super().closeEvent(event)
+
+    def update_view(self):
+        """Draw only the visible range at the pyramid level matching the plot width"""
+        if self.updating_view or self.curve is None or self.pyramid is None:
+            return
+        x0, x1 = self.plot_widget.viewRange()[0]
 
-                    # Set up custom x-axis labels with time strings
-                    # Show every nth label to avoid overcrowding
-                    step = max(1, len(self.time_labels) // 10)
-                    ticks = []
-                    for i in range(0, len(self.time_labels), step):
-                        ticks.append((i, self.time_labels[i]))
-
-                    ax = self.plot_widget.getAxis('bottom')
-                    ax.setTicks([ticks])
-
-                    # Disable auto SI prefix and format as scientific notation
-                    left_axis = self.plot_widget.getAxis('left')
-                    left_axis.enableAutoSIPrefix(False)
-
-                    # Override the tick string method to show scientific notation
-                    class ScientificAxis(pg.AxisItem):
-                        def tickStrings(self, values, scale, spacing):
-                            return [f'{val:.1e}' for val in values]
-
-                    # Replace the left axis
-                    self.plot_widget.setAxisItems({'left': ScientificAxis(orientation='left')})
-
-                    # Update window title and info
-                    self.plot_widget.setTitle(f'Data from {file_path.split("/")[-1]}')
-                    self.info_label.setText(
-                        f"Loaded {len(self.pressure_data)} data points from {file_path.split('/')[-1]}")
-
-                    # Set ranges
-                    self.plot_widget.setXRange(0, len(self.time_data) - 1)
-                    if self.pressure_data:
-                        min_pressure = min(self.pressure_data)
-                        max_pressure = max(self.pressure_data)
-                        margin = (max_pressure - min_pressure) * 0.1
-                        self.plot_widget.setYRange(min_pressure - margin, max_pressure + margin)
-                else:
-                    self.info_label.setText("No valid data found in CSV")
-
-            except Exception as e:
-                self.info_label.setText(f"Error loading CSV: {str(e)}")
+        self.updating_view = True
+        try:
+            xs, ys, level = self.pyramid.view(self.time_data, self.pressure_data,
+                                              x0, x1, self.plot_widget.width())
+            self.curve.setData(xs, ys)
+            self.curve.setSymbol('o' if level == 0 and len(xs) <= MAX_SYMBOL_POINTS else None)
+        finally:
+            self.updating_view = False
 
     def mouse_clicked(self, event):
         """Show crosshair and values when user clicks on the plot"""
@@ -169,15 +260,14 @@ class MainWindow(QMainWindow):
             y = mouse_point.y()
 
             # Find nearest data point and display values
-            if self.time_data and self.pressure_data:
-                # Find the closest index
-                closest_idx = min(range(len(self.time_data)),
-                                  key=lambda i: abs(self.time_data[i] - x))
+            if len(self.time_data) and len(self.pressure_data):
+                # Find the closest index (binary search, time_data is sorted)
+                closest_idx = nearest_index(self.time_data, x)
 
                 if 0 <= closest_idx < len(self.time_data):
                     closest_x = self.time_data[closest_idx]
                     closest_pressure = self.pressure_data[closest_idx]
-                    closest_time_label = self.time_labels[closest_idx]
+                    closest_time_label = format_local_times(self.timestamps[closest_idx:closest_idx + 1])[0]
 
                     # Update crosshair position to nearest point
                     self.vLine.setPos(closest_x)
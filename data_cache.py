@@ -0,0 +1,118 @@
+import itertools
+import os
+import secrets
+import threading
+from collections import OrderedDict
+
+from pressure_io import CsvTailReader, GrowableArray
+from pressure_stats import StreamStats
+
+
+_counter = itertools.count(1)
+# Kurzor z doby před restartem serveru nesmí projít jako platný
+_PROCESS_TOKEN = secrets.token_hex(4)
+
+
+def _next_generation() -> str:
+    return f"{_PROCESS_TOKEN}.{next(_counter)}"
+
+
+class CachedLog:
+    """Parsed arrays of one pressure log, extended as the file grows.
+
+    The file is re-read only when its inode, size or mtime changed and then
+    only from the last parsed offset. `generation` changes whenever the
+    arrays had to be rebuilt (rotation, truncation), so row positions from
+    an older generation (or an earlier server process) are no longer valid.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.reader = CsvTailReader(path)
+        self.times = GrowableArray()
+        self.values = GrowableArray()
+        self.generation = _next_generation()
+        self.bad_rows = 0
+        # Statistiky se počítají z nových řádků při každém refresh
+        self.stats = StreamStats()
+        self._key = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes
+
+    def refresh(self):
+        with self._lock:
+            st = os.stat(self.path)
+            key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if key == self._key:
+                return
+            times, values, reset = self.reader.read_new()
+            if reset:
+                # Nové buffery - rozpracované požadavky drží pohledy na ty staré
+                self.times = GrowableArray()
+                self.values = GrowableArray()
+                self.generation = _next_generation()
+                self.bad_rows = 0
+                self.stats = StreamStats()
+            self.times.extend(times)
+            self.values.extend(values)
+            self.stats.extend(times, values)
+            self.bad_rows += self.reader.bad_rows
+            self.reader.bad_rows = 0
+            self._key = key
+
+    def stats_summary(self) -> dict:
+        with self._lock:
+            return self.stats.summary()
+
+    def snapshot(self):
+        """Return (times, values, generation); the arrays are read-only views"""
+        with self._lock:
+            times = self.times.data
+            values = self.values.data
+            times.flags.writeable = False
+            values.flags.writeable = False
+            return times, values, self.generation
+
+
+class PressureCache:
+    """Thread-safe LRU cache of parsed pressure logs with a memory cap"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> CachedLog:
+        """Return the up-to-date cached log for `path`"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = CachedLog(path)
+            self._entries.move_to_end(path)
+
+        # Souběžné požadavky na stejný soubor čekají na jedno parsování
+        entry.refresh()
+
+        with self._lock:
+            self._evict(keep=path)
+        return entry
+
+    def _evict(self, keep: str):
+        total = sum(e.nbytes for e in self._entries.values())
+        for path in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= self._entries.pop(path).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = PressureCache()
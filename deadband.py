@@ -0,0 +1,161 @@
+"""Deadband and swinging-door compression of the logged samples.
+
+A flat pressure (hours of "3.4E-05") needs only a few rows. The filter
+passes a sample to the log only when the stored rows can no longer
+reproduce the signal within a relative tolerance:
+
+- "swinging_door": the signal between two stored rows is the straight
+  line connecting them. A row is stored when no line from the last stored
+  row fits all samples since then within `tolerance` (relative to each
+  sample), so ramps such as a pump-down are stored as a few segments.
+  The stored row ends the last line that still fits; when the sample's own
+  value is off that line, its pressure is moved onto the line (within the
+  tolerance of the reading).
+- "deadband": a sample is stored when it differs from the last stored
+  value by more than `tolerance` (the line is flat).
+
+A row is stored at least every `max_gap` seconds (heartbeat), so a quiet
+log still shows the collector was running. Viewers and alarms get every
+sample through the bus; only the log is compressed.
+"""
+import math
+
+import numpy as np
+
+from metrics import counter
+
+
+MODES = ("swinging_door", "deadband")
+
+SAMPLES = counter("deadband_samples_total", "Samples offered to the log filter", ["result"])
+
+
+class DeadbandFilter:
+    """Selects the records worth storing; records need "epoch" and "pressure"."""
+
+    def __init__(self, tolerance: float = 0.02, max_gap: float = 60.0, mode: str = "swinging_door"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        if tolerance < 0:
+            raise ValueError(f"tolerance must not be negative, got {tolerance}")
+        self.tolerance = tolerance
+        self.max_gap = max_gap
+        self.mode = mode
+        self.offered = 0
+        self.stored = 0
+        self._anchor = None
+        self._prev = None
+        self._slope_low = -math.inf
+        self._slope_high = math.inf
+
+    def _band(self, p: float):
+        tol = abs(p) * self.tolerance
+        return p - tol, p + tol
+
+    def _store(self, record: dict, out: list):
+        out.append(record)
+        self._anchor = record
+        self._slope_low = -math.inf
+        self._slope_high = math.inf
+
+    def _on_door(self, record: dict) -> dict:
+        """`record` with its pressure moved onto the door if no fitting line passes through it"""
+        dt = record["epoch"] - self._anchor["epoch"]
+        if dt <= 0:
+            return record
+        p0 = float(self._anchor["pressure"])
+        slope = (float(record["pressure"]) - p0) / dt
+        if self._slope_low <= slope <= self._slope_high:
+            return record
+        slope = min(max(slope, self._slope_low), self._slope_high)
+        return dict(record, pressure=p0 + slope * dt)
+
+    def _open_door(self, record: dict) -> bool:
+        """Narrow the door with `record`, False when no line from the anchor fits any more"""
+        dt = record["epoch"] - self._anchor["epoch"]
+        if dt <= 0:
+            return True
+        low, high = self._band(float(record["pressure"]))
+        p0 = float(self._anchor["pressure"])
+        slope_low = max(self._slope_low, (low - p0) / dt)
+        slope_high = min(self._slope_high, (high - p0) / dt)
+        if slope_low > slope_high:
+            return False
+        self._slope_low, self._slope_high = slope_low, slope_high
+        return True
+
+    def offer(self, record: dict) -> list:
+        """Records to write now (none or one)"""
+        self.offered += 1
+        out = []
+        if self._anchor is None:
+            self._store(record, out)
+        elif self.mode == "deadband":
+            p0 = float(self._anchor["pressure"])
+            low, high = self._band(p0)
+            if (not low <= float(record["pressure"]) <= high
+                    or record["epoch"] - self._anchor["epoch"] >= self.max_gap):
+                self._store(record, out)
+        else:
+            heartbeat = record["epoch"] - self._anchor["epoch"] >= self.max_gap
+            if heartbeat or not self._open_door(record):
+                if self._prev is self._anchor:
+                    self._store(record, out)
+                else:
+                    # Konec úsečky je předchozí vzorek (posunutý na úsečku), nová začíná u něj
+                    self._store(self._on_door(self._prev), out)
+                    self._open_door(record)
+
+        self._prev = record
+        self.stored += len(out)
+        SAMPLES.inc(result="stored" if out else "skipped")
+        return out
+
+    def flush(self) -> list:
+        """The last sample, if it is not stored yet (call before closing the log)"""
+        if self._prev is None or self._prev is self._anchor:
+            return []
+        out = []
+        prev = self._on_door(self._prev) if self.mode == "swinging_door" else self._prev
+        self._store(prev, out)
+        self.stored += 1
+        SAMPLES.inc(result="stored")
+        return out
+
+    def __str__(self):
+        ratio = self.offered / self.stored if self.stored else 0.0
+        return (f"{self.stored} of {self.offered} samples stored ({ratio:.1f}:1, {self.mode}, "
+                f"tolerance {self.tolerance:g})")
+
+
+def reconstruction_error(times, pressures, stored_times, stored_pressures, mode: str = "swinging_door") -> float:
+    """Largest relative error of the signal rebuilt from the stored rows.
+
+    Swinging-door rows are joined by lines (error relative to each sample),
+    deadband rows hold their value until the next row (error relative to
+    the stored value). The filter keeps both within its tolerance.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    pressures = np.asarray(pressures, dtype=np.float64)
+    stored_times = np.asarray(stored_times, dtype=np.float64)
+    stored_pressures = np.asarray(stored_pressures, dtype=np.float64)
+    if mode == "swinging_door":
+        rebuilt = np.interp(times, stored_times, stored_pressures)
+        return float(np.max(np.abs(rebuilt - pressures) / np.abs(pressures)))
+    held = stored_pressures[np.searchsorted(stored_times, times, side="right") - 1]
+    return float(np.max(np.abs(pressures - held) / np.abs(held)))
+
+
+def add_deadband_arguments(parser):
+    """--deadband, --deadband-mode and --max-gap for collection scripts"""
+    parser.add_argument("--deadband", type=float, metavar="REL",
+                        help="log only samples off the predicted line by more than REL (e.g. 0.02 = 2 %%)")
+    parser.add_argument("--deadband-mode", choices=MODES, default="swinging_door")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="store a row at least every N seconds")
+
+
+def deadband_args(args):
+    """DeadbandFilter keyword arguments from the parsed options, None when disabled"""
+    if args.deadband is None:
+        return None
+    return dict(tolerance=args.deadband, max_gap=args.max_gap, mode=args.deadband_mode)
@@ -1,9 +1,21 @@
 import sys
-import csv
+import time
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtWidgets
 from datetime import datetime
 
+import numpy as np
+
+from log_index import open_series
+from metrics import REGISTRY, Histogram, histogram
+from pressure_bus import BusSubscriber
+from pressure_io import CsvTailReader, GrowableArray, format_timestamp, nearest_index
+from pressure_stats import StreamStats
+from pyramid import PressurePyramid, sidecar_path
+from qt_loader import LoadTask
+
+UPDATE_SECONDS = histogram("viewer_update_seconds", "Appending samples and redrawing the plot", ["viewer"])
+
 
 class TimeAxisItem(pg.AxisItem):
     """Custom axis pro zobrazení datetime"""
@@ -56,8 +68,29 @@ class PressureViewer(QtWidgets.QMainWindow):
         super().__init__()
 
         self.filename = "spce_pressure.csv"
-        self.data_x = []  # timestamps
-        self.data_y = []  # pressure values
+        self.reader = CsvTailReader(self.filename)
+        # CSV se čte na pozadí, vždy nejvýše jedno čtení najednou
+        self.load_task = None
+        # Uzavřené (komprimované) segmenty logu se načítají až při posunu grafu do minulosti
+        self.series = open_series(self.filename)
+        self.history_task = None
+        self.history_requests = []
+        self.history_from = None
+        # Živá data z kolektoru přes lokální socket, CSV jen když kolektor neběží
+        self.bus = BusSubscriber()
+        # Vzorky ze socketu čekají, dokud se nedočte historie z CSV
+        self.first_load_done = False
+        self.bus_backlog = []
+        self.data_x = GrowableArray()  # timestamps
+        self.data_y = GrowableArray()  # pressure values
+        # Průběžné statistiky (klouzavá okna, dP/dt) bez procházení historie
+        self.stats = StreamStats()
+
+        # Pyramida min/max pro rychlé překreslení dlouhé historie
+        self.pyramid_path = sidecar_path(self.filename, x="time")
+        self.pyramid = PressurePyramid.load(self.pyramid_path) or PressurePyramid()
+        self.pyramid_saved = time.monotonic()
+        self.updating_view = False
 
         # Nastavení okna
         self.setWindowTitle('DIGITEL SPCe Pressure Monitor')
@@ -85,8 +118,21 @@ class PressureViewer(QtWidgets.QMainWindow):
         self.btn_reset_zoom.clicked.connect(self.reset_zoom)
         info_layout.addWidget(self.btn_reset_zoom)
 
+        self.btn_metrics = QtWidgets.QPushButton("Metrics")
+        self.btn_metrics.setCheckable(True)
+        self.btn_metrics.toggled.connect(self.show_metrics)
+        info_layout.addWidget(self.btn_metrics)
+
         layout.addLayout(info_layout)
 
+        # Stavový panel s časy a čítači (metrics), skrytý dokud se nezapne
+        self.label_metrics = QtWidgets.QLabel("")
+        self.label_metrics.setStyleSheet("font-family: monospace;")
+        self.label_metrics.setVisible(False)
+        layout.addWidget(self.label_metrics)
+        self.metrics_timer = QtCore.QTimer()
+        self.metrics_timer.timeout.connect(self.update_metrics)
+
         # Graf s custom osami
         self.plot_widget = pg.PlotWidget(
             axisItems={
@@ -120,6 +166,7 @@ class PressureViewer(QtWidgets.QMainWindow):
             pen=pg.mkPen(color=(75, 192, 192), width=4),
             name='Pressure'
         )
+        self.plot_widget.sigXRangeChanged.connect(self.update_view)
 
         # Načti data
         self.load_data()
@@ -129,61 +176,244 @@ class PressureViewer(QtWidgets.QMainWindow):
         self.timer.timeout.connect(self.load_data)
         self.timer.start(1000)  # 1 sekund
 
+        # Socket kolektoru (každých 50 ms)
+        self.bus_timer = QtCore.QTimer()
+        self.bus_timer.timeout.connect(self.poll_bus)
+        self.bus_timer.start(50)
+
     def load_data(self):
-        """Načte data z CSV"""
-        try:
-            timestamps = []
-            pressures = []
-            time_strings = []
-
-            with open(self.filename, newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-
-                for row in reader:
-                    try:
-                        # Převeď timestamp string na unix timestamp
-                        time_str = row["time"]
-                        dt = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                        timestamp = dt.timestamp()
-
-                        timestamps.append(timestamp)
-                        pressures.append(float(row["pressure"].strip()))
-                        time_strings.append(time_str)
-                    except (ValueError, KeyError) as e:
-                        print(f"Skipping invalid row: {row} | Error: {e}")
-                        continue
-
-            if not timestamps:
-                self.label_info.setText("No data found")
-                return
-
-            # Ulož data
-            self.data_x = timestamps
-            self.data_y = pressures
-            self.time_labels = time_strings
-
-            # Aktualizuj graf
-            self.curve.setData(self.data_x, self.data_y)
-
-            # Statistiky
-            min_p = min(pressures)
-            max_p = max(pressures)
-            #avg_p = sum(pressures) / len(pressures)
-
-            self.label_info.setText(f"Points: {len(pressures)}   | ")
-            self.label_stats.setText(f"Min: {min_p:.2e} | Max: {max_p:.2e}")
-
-            #print(f"Loaded {len(pressures)} data points")
-
-        except FileNotFoundError:
+        """Spustí načtení nových řádků z CSV ve vlákně na pozadí"""
+        if self.bus.connected or self.load_task is not None:
+            return
+        self.load_task = LoadTask(self.reader.read_new)
+        self.load_task.signals.progress.connect(self.load_progress)
+        self.load_task.signals.finished.connect(self.data_loaded)
+        self.load_task.signals.failed.connect(self.load_failed)
+        self.load_task.signals.cancelled.connect(self.load_cancelled)
+        self.load_task.start()
+
+    def load_progress(self, done, total):
+        # Jen u delšího čtení (první načtení velkého souboru)
+        if 0 < done < total:
+            self.label_info.setText(f"Loading data... {100 * done // total} %")
+
+    def data_loaded(self, result):
+        """Zpracuje řádky načtené na pozadí (volá se v GUI vlákně)"""
+        self.load_task = None
+        timestamps, pressures, reset = result
+
+        if reset and len(self.data_x) and self.series.has_segments():
+            # Logger uzavřel segment - data zůstávají, řádky zapsané před rotací se doplní ze segmentu
+            self.load_history(self.data_x.data[-1], None)
+        elif reset:
+            self.data_x.clear()
+            self.data_y.clear()
+            self.pyramid = PressurePyramid()
+            self.stats.clear()
+            self.history_from = None
+
+        if len(self.data_x) and len(timestamps):
+            # Řádky, které už přišly přes socket, přeskoč
+            newer = timestamps > self.data_x.data[-1]
+            timestamps = timestamps[newer]
+            pressures = pressures[newer]
+
+        if self.reader.bad_rows:
+            print(f"Skipped {self.reader.bad_rows} invalid rows")
+            self.reader.bad_rows = 0
+
+        if len(timestamps):
+            self.append_samples(timestamps, pressures)
+        elif len(self.data_y) == 0:
+            self.label_info.setText("No data found")
+        self.release_bus_backlog()
+
+    def load_failed(self, error):
+        self.load_task = None
+        if isinstance(error, FileNotFoundError):
             self.label_info.setText(f"File not found: {self.filename}")
-        except Exception as e:
-            self.label_info.setText(f"Error: {str(e)}")
-            print(f"Error loading data: {e}")
+        else:
+            self.label_info.setText(f"Error: {str(error)}")
+            print(f"Error loading data: {error}")
+        self.release_bus_backlog()
+
+    def load_cancelled(self):
+        self.load_task = None
+        self.release_bus_backlog()
+
+    def poll_bus(self):
+        """Přidá vzorky publikované kolektorem"""
+        timestamps, pressures = self.bus.poll()
+        if len(timestamps) == 0:
+            return
+        if not self.first_load_done:
+            self.bus_backlog.append((timestamps, pressures))
+            return
+        self.append_samples(timestamps, pressures)
+
+    def release_bus_backlog(self):
+        """Po prvním čtení CSV přidej vzorky ze socketu, které mezitím přišly"""
+        if self.first_load_done:
+            return
+        self.first_load_done = True
+        if not self.bus_backlog:
+            return
+        timestamps = np.concatenate([t for t, _ in self.bus_backlog])
+        pressures = np.concatenate([p for _, p in self.bus_backlog])
+        self.bus_backlog = []
+        if len(self.data_x):
+            # Vzorky, které už jsou v CSV, přeskoč
+            newer = timestamps > self.data_x.data[-1]
+            timestamps = timestamps[newer]
+            pressures = pressures[newer]
+        if len(timestamps):
+            self.append_samples(timestamps, pressures)
+
+    def append_samples(self, timestamps, pressures):
+        with UPDATE_SECONDS.time(viewer="desktop_monitor"):
+            self._append_samples(timestamps, pressures)
+
+    def _append_samples(self, timestamps, pressures):
+        # Přidej nová data do bufferů
+        self.data_x.extend(timestamps)
+        self.data_y.extend(pressures)
+
+        # Aktualizuj pyramidu a graf
+        self.pyramid.sync(self.data_x.data, self.data_y.data)
+        self.update_view()
+        if time.monotonic() - self.pyramid_saved > 300:
+            self.save_pyramid()
+
+        # Statistiky - jen přes nové hodnoty
+        self.stats.extend(timestamps, pressures)
+
+        source = "live" if self.bus.connected else "CSV"
+        self.label_info.setText(f"Points: {len(self.data_y)} ({source})   | ")
+        text = f"Min: {self.stats.min:.2e} | Max: {self.stats.max:.2e}"
+        for window in self.stats.windows:
+            if window.std is not None and window.dpdt is not None:
+                text += (f" | {window.window:g} s: {window.mean:.2e} ± {window.std:.1e},"
+                         f" dP/dt {window.dpdt:.2e} Pa/s")
+        self.label_stats.setText(text)
+
+    def show_metrics(self, checked):
+        self.label_metrics.setVisible(checked)
+        if checked:
+            self.update_metrics()
+            self.metrics_timer.start(2000)
+        else:
+            self.metrics_timer.stop()
+
+    def update_metrics(self):
+        """Počet, průměr a p95 histogramů a hodnoty čítačů tohoto procesu"""
+        lines = []
+        for metric in REGISTRY.metrics():
+            if isinstance(metric, Histogram):
+                for key, (n, mean, p95) in sorted(metric.summary().items()):
+                    if n:
+                        labels = ",".join(key)
+                        lines.append(f"{metric.name}{{{labels}}}: n={n} mean={mean * 1000:.2f} ms"
+                                     f" p95<={p95 * 1000:g} ms")
+            elif metric.total():
+                lines.append(f"{metric.name}: {metric.total():g}")
+        self.label_metrics.setText("\n".join(lines) or "No metrics yet")
+
+    def load_history(self, start, end):
+        """Načti řádky start..end z uzavřených segmentů na pozadí"""
+        self.history_requests.append((start, end))
+        if self.history_task is None:
+            self.next_history()
+
+    def next_history(self):
+        self.history_task = None
+        if not self.history_requests:
+            return
+        start, end = self.history_requests.pop(0)
+        self.history_task = LoadTask(self.series.read, start, end)
+        self.history_task.signals.finished.connect(self.history_loaded)
+        self.history_task.signals.failed.connect(self.history_failed)
+        self.history_task.signals.cancelled.connect(self.next_history)
+        self.history_task.start()
+
+    def history_loaded(self, result):
+        timestamps, pressures, _ = result
+        self.merge_samples(timestamps, pressures)
+        self.next_history()
+
+    def history_failed(self, error):
+        print(f"Error loading log segments: {error}")
+        self.next_history()
+
+    def merge_samples(self, timestamps, pressures):
+        """Zařaď starší řádky (historie, mezera kolem rotace) mezi data podle času"""
+        x = self.data_x.data
+        new = ~np.isin(timestamps, x)
+        if not new.any():
+            return
+        xs = np.concatenate([x, timestamps[new]])
+        ys = np.concatenate([self.data_y.data, pressures[new]])
+        order = np.argsort(xs, kind="stable")
+        self.data_x = GrowableArray(len(xs))
+        self.data_y = GrowableArray(len(ys))
+        self.data_x.extend(xs[order])
+        self.data_y.extend(ys[order])
+        # Pyramida se při změně začátku dat přestaví
+        self.pyramid.sync(self.data_x.data, self.data_y.data)
+        # Statistiky znovu přes všechna data - min/max musí zahrnout i doplněnou historii
+        # (klouzavá okna projdou jen posledních pár minut)
+        self.stats.clear()
+        self.stats.extend(self.data_x.data, self.data_y.data)
+        self.update_view()
+
+    def update_view(self):
+        """Vykresli jen viditelný rozsah v úrovni pyramidy podle šířky grafu"""
+        if self.updating_view or len(self.data_x) == 0:
+            return
+        x = self.data_x.data
+        y = self.data_y.data
+        if self.plot_widget.getViewBox().state['autoRange'][0]:
+            # Automatický rozsah sleduje celá data
+            x0, x1 = x[0], x[-1]
+        else:
+            x0, x1 = self.plot_widget.viewRange()[0]
+            if x0 < x[0] and (self.history_from is None or x0 < self.history_from):
+                # Pohled sahá před načtená data - dočti segmenty, které ho překrývají
+                self.history_from = x0
+                self.load_history(x0, x[0])
+
+        self.updating_view = True
+        try:
+            xs, ys, level = self.pyramid.view(x, y, x0, x1, self.plot_widget.width())
+            self.curve.setData(xs, ys)
+        finally:
+            self.updating_view = False
+
+    def save_pyramid(self):
+        try:
+            self.pyramid.save(self.pyramid_path)
+        except OSError as e:
+            print(f"Error saving pyramid: {e}")
+        self.pyramid_saved = time.monotonic()
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.metrics_timer.stop()
+        if self.load_task is not None:
+            # Čtení skončí po aktuálním bloku
+            self.load_task.cancel()
+            self.load_task.done.wait(5)
+        self.history_requests.clear()
+        if self.history_task is not None:
+            self.history_task.cancel()
+            self.history_task.done.wait(5)
+        self.bus.close()
+        self.save_pyramid()
+        super().closeEvent(event)
 
     def reset_zoom(self):
         """Reset zoom na celá data"""
-        self.plot_widget.autoRange()
+        self.plot_widget.enableAutoRange()
+        self.update_view()
 
     def mouse_moved(self, evt):
         """Zobraz crosshair a hodnoty při pohybu myši"""
@@ -195,14 +425,13 @@ class PressureViewer(QtWidgets.QMainWindow):
             self.crosshair_h.setPos(mouse_point.y())
 
             # Najdi nejbližší bod
-            if self.data_x and self.data_y:
-                # Najdi index nejbližšího bodu
-                distances = [abs(x - mouse_point.x()) for x in self.data_x]
-                idx = distances.index(min(distances))
+            if len(self.data_x) and len(self.data_y):
+                # Najdi index nejbližšího bodu (binární hledání v seřazených časech)
+                idx = nearest_index(self.data_x.data, mouse_point.x())
 
                 if 0 <= idx < len(self.data_y):
-                    time_str = self.time_labels[idx] if idx < len(self.time_labels) else "N/A"
-                    pressure = self.data_y[idx]
+                    time_str = format_timestamp(self.data_x.data[idx])
+                    pressure = self.data_y.data[idx]
                     self.plot_widget.setTitle(f"Time: {time_str} | Pressure: {pressure:.2e} Pa")
 
 
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def lttb(x, y, n_out: int):
+    """Largest-Triangle-Three-Buckets downsampling, returns the selected indices.
+
+    Keeps the first and last point and from every bucket in between the point
+    forming the largest triangle with the previously selected point and the
+    average of the next bucket. The per-bucket work is vectorized, only the
+    bucket loop runs in Python.
+    """
+    size = len(x)
+    if n_out >= size:
+        return np.arange(size)
+    if n_out < 3:
+        # Na trojúhelníky nezbývá místo - první a poslední bod
+        return np.array([0, size - 1][:max(n_out, 0)], dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, size - 1, n_out - 1).astype(np.int64)
+
+    # Průměry všech bucketů najednou přes kumulativní součty
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.diff(edges)
+    avg_x = (cx[edges[1:]] - cx[edges[:-1]]) / counts
+    avg_y = (cy[edges[1:]] - cy[edges[:-1]]) / counts
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, n_out: int):
+    """Per-bucket min/max downsampling, returns the selected indices in order.
+
+    Every bucket contributes its minimum and maximum, so spikes survive
+    regardless of the zoom level.
+    """
+    size = len(y)
+    buckets = n_out // 2
+    if size <= n_out:
+        return np.arange(size)
+    if buckets < 1:
+        return np.arange(min(max(n_out, 0), 1))
+
+    y = np.asarray(y, dtype=np.float64)
+    k = size // buckets
+    m = buckets * k
+    block = y[:m].reshape(buckets, k)
+    base = np.arange(buckets) * k
+    idx = np.stack([base + block.argmin(axis=1), base + block.argmax(axis=1)], axis=1)
+    idx = np.sort(idx, axis=1).ravel()
+    if m < size:
+        tail = y[m:]
+        idx = np.concatenate([idx, np.sort([m + tail.argmin(), m + tail.argmax()])])
+    return np.unique(idx)
+
+
+def downsample(x, y, n_out: int, method: str = "lttb"):
+    """Return (x, y) reduced to about n_out points with the given method"""
+    if method == "lttb":
+        idx = lttb(x, y, n_out)
+    elif method == "minmax":
+        idx = minmax(y, n_out)
+    else:
+        raise ValueError(f"Unknown downsampling method {method!r}")
+    return x[idx], y[idx]
@@ -0,0 +1,46 @@
+"""Data collection script started by updategraph.py.
+
+Usage: python dynamic_data.py [csv_file] [--port COM5] [--rate 2] [--rotate-hours 24]
+Without --port the samples come from a simulated SPCe controller.
+"""
+import argparse
+
+from alarms import AlarmEngine
+from deadband import DeadbandFilter, add_deadband_arguments, deadband_args
+from pressure_bus import DEFAULT_ADDRESS
+from pressure_logger import add_rotation_arguments, rotation_args
+from spce_controller import SPCe
+from spce_simulator import LeakModel, SimulatedController, SimulatedSerial
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect SPCe pressure data into a CSV file")
+    parser.add_argument("csv_file", nargs="?", default="pressure_test_data.csv")
+    parser.add_argument("--port", help="serial port of a real controller, e.g. COM5")
+    parser.add_argument("--addr", default="05", help="controller address in hex")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--rate", type=float, default=2.0, help="samples per second")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    add_rotation_arguments(parser)
+    parser.add_argument("--alarms", help="JSON file with alarm rules per address, see alarms.py")
+    parser.add_argument("--max-rate", type=float, help="sample up to this rate during fast pressure changes")
+    add_deadband_arguments(parser)
+    args = parser.parse_args()
+
+    addr = int(args.addr, 16)
+    alarms = AlarmEngine.from_config(args.alarms) if args.alarms else None
+    if args.port:
+        spce = SPCe(args.port, addr=addr, baud=args.baud)
+    else:
+        controller = SimulatedController({addr: LeakModel()})
+        spce = SPCe("simulator", addr=addr, ser=SimulatedSerial(controller))
+
+    options = deadband_args(args)
+    spce.save_to_csv(filename=args.csv_file, bus_address=DEFAULT_ADDRESS, rate=args.rate,
+                    metrics_port=args.metrics_port, alarms=alarms, max_rate=args.max_rate,
+                    deadband=DeadbandFilter(**options) if options else None, **rotation_args(args))
+    spce.close()
+
+
+if __name__ == "__main__":
+    main()
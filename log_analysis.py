@@ -0,0 +1,196 @@
+"""Batch analysis of archived pressure logs.
+
+Scans a directory for logs written by SPCe.save_to_csv (plain or
+compressed segments) and computes one summary row per run: base pressure,
+time to reach a threshold, leak rate (rate of rise at the end of the run)
+and the number of pressure spikes. Files are analysed in parallel, one
+process per core, and the rows are written to a CSV or Parquet file:
+
+    python log_analysis.py archive/ --out summary.parquet --threshold 1e-6
+"""
+import argparse
+import csv
+import functools
+import glob
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from log_segments import COMPRESSIONS, read_segment
+from pressure_io import format_timestamp, read_csv
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+FIELDS = ["file", "rows", "bad_rows", "start", "end", "duration_s", "start_pressure", "base_pressure",
+          "base_time_s", "max_pressure", "time_to_threshold_s", "leak_rate", "leak_rate_pa_l_s",
+          "spikes", "error"]
+
+
+def rolling_median(values: np.ndarray, width: int) -> np.ndarray:
+    """Centered running median over `width` samples (edges padded)"""
+    if width <= 1 or len(values) < width:
+        return values
+    half = width // 2
+    padded = np.pad(values, (half, width - 1 - half), mode="edge")
+    return np.median(np.lib.stride_tricks.sliding_window_view(padded, width), axis=1)
+
+
+def rate_of_rise(times: np.ndarray, pressures: np.ndarray) -> float:
+    """Least-squares dP/dt in Pa/s, NaN with fewer than 3 samples"""
+    if len(times) < 3:
+        return math.nan
+    t = times - times.mean()
+    denom = float(np.dot(t, t))
+    if denom == 0:
+        return math.nan
+    return float(np.dot(t, pressures - pressures.mean()) / denom)
+
+
+def summarize(times, pressures, threshold: float = 1e-6, leak_window: float = 600.0,
+              spike_factor: float = 3.0, smooth: int = 5, volume: float = None) -> dict:
+    """Summary of one run.
+
+    Pressures are smoothed by a running median of `smooth` samples, so a
+    single bad reading does not count as the base pressure. The leak rate
+    is dP/dt over the last `leak_window` seconds; with `volume` (litres) it
+    is also given as a throughput in Pa*l/s. A spike is a run of samples
+    above `spike_factor` times the smoothed pressure.
+    """
+    row = dict(rows=len(times))
+    if len(times) == 0:
+        return row
+    if np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        pressures = pressures[order]
+
+    smoothed = rolling_median(pressures, smooth)
+    t0 = times[0]
+    base = int(np.argmin(smoothed))
+    below = np.flatnonzero(smoothed <= threshold)
+    tail = times >= times[-1] - leak_window
+    leak_rate = rate_of_rise(times[tail], pressures[tail])
+    spiking = pressures > spike_factor * smoothed
+    spikes = int(np.count_nonzero(spiking[1:] & ~spiking[:-1]) + spiking[0])
+
+    row.update(
+        start=format_timestamp(t0),
+        end=format_timestamp(times[-1]),
+        duration_s=float(times[-1] - t0),
+        start_pressure=float(smoothed[0]),
+        base_pressure=float(smoothed[base]),
+        base_time_s=float(times[base] - t0),
+        max_pressure=float(pressures.max()),
+        time_to_threshold_s=float(times[below[0]] - t0) if len(below) else math.nan,
+        leak_rate=leak_rate,
+        leak_rate_pa_l_s=leak_rate * volume if volume else math.nan,
+        spikes=spikes,
+    )
+    return row
+
+
+def analyze_file(path: str, **options) -> dict:
+    """Read one log and summarize it (runs in a worker process)"""
+    try:
+        # Každý soubor je samostatný běh, segmenty rotovaného logu se nespojují
+        if path.endswith(tuple(COMPRESSIONS.values())):
+            times, pressures, bad_rows = read_segment(path)
+        else:
+            times, pressures, bad_rows = read_csv(path)
+        row = summarize(times, pressures, **options)
+        row["bad_rows"] = bad_rows
+    except Exception as e:
+        row = dict(error=f"{type(e).__name__}: {e}")
+    row["file"] = path
+    return row
+
+
+def find_logs(directory: str, recursive: bool = True) -> list:
+    """CSV logs and compressed segments under `directory`"""
+    pattern = os.path.join(glob.escape(directory), "**" if recursive else "", "*.csv")
+    paths = []
+    for suffix in ("", *COMPRESSIONS.values()):
+        paths.extend(glob.glob(pattern + suffix, recursive=recursive))
+    return sorted(set(paths))
+
+
+def analyze(paths, jobs: int = None, progress=None, **options) -> list:
+    """Summaries of `paths` computed in a process pool, in the order of `paths`.
+
+    The largest files are submitted first so the workers finish together.
+    """
+    worker = functools.partial(analyze_file, **options)
+    by_size = sorted(paths, key=lambda p: os.path.getsize(p), reverse=True)
+    rows = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(worker, path) for path in by_size]
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows[row["file"]] = row
+            if progress is not None:
+                progress(done, len(futures), row)
+    return [rows[path] for path in paths]
+
+
+def write_summary(rows, filename: str):
+    """Write the rows to CSV, or to Parquet when the name ends with .parquet"""
+    if filename.endswith(".parquet"):
+        if pyarrow is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow), or use a .csv name")
+        columns = {name: [row.get(name) for row in rows] for name in FIELDS}
+        pyarrow.parquet.write_table(pyarrow.table(columns), filename)
+        return
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a directory of SPCe pressure logs")
+    parser.add_argument("directory")
+    parser.add_argument("--out", default="summary.csv", help=".csv or .parquet")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--no-recursive", action="store_true", help="only the directory itself")
+    parser.add_argument("--threshold", type=float, default=1e-6, help="pressure for time-to-threshold (Pa)")
+    parser.add_argument("--leak-window", type=float, default=600.0, help="seconds at the end for the leak rate")
+    parser.add_argument("--spike-factor", type=float, default=3.0, help="spike = pressure above N x smoothed")
+    parser.add_argument("--smooth", type=int, default=5, help="running median width in samples")
+    parser.add_argument("--volume", type=float, help="chamber volume in litres (leak rate in Pa*l/s)")
+    args = parser.parse_args()
+    if args.out.endswith(".parquet") and pyarrow is None:
+        parser.error("Parquet output needs pyarrow (pip install pyarrow), or use a .csv name")
+
+    # Souhrn z minulého běhu ve stejném adresáři není log
+    paths = [p for p in find_logs(args.directory, recursive=not args.no_recursive)
+             if os.path.abspath(p) != os.path.abspath(args.out)]
+    if not paths:
+        parser.error(f"No logs found in {args.directory}")
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+
+    def progress(done, total, row):
+        status = row.get("error") or f"{row['rows']} rows"
+        print(f"[{done}/{total}] {row['file']}: {status}")
+
+    start = time.perf_counter()
+    rows = analyze(paths, jobs=args.jobs, progress=progress, threshold=args.threshold,
+                   leak_window=args.leak_window, spike_factor=args.spike_factor,
+                   smooth=args.smooth, volume=args.volume)
+    elapsed = time.perf_counter() - start
+    write_summary(rows, args.out)
+
+    n_rows = sum(row.get("rows", 0) for row in rows)
+    print(f"{len(rows)} files, {n_rows} rows, {total_bytes / 1e6:.1f} MB in {elapsed:.1f} s "
+          f"({n_rows / elapsed:,.0f} rows/s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Sparse time -> byte offset index for pressure CSV logs.
+
+The index stores the time and position of the first line after every
+INDEX_BLOCK bytes of the log. A time range query seeks to the indexed
+line just before `start` and parses only up to the line after `end`, so
+its cost depends on the size of the result, not of the file. Building the
+index reads one line per block (no full scan); it is extended as the log
+grows and kept beside the log in LOG.idx.npz.
+
+Rotated logs (LOG.1, LOG.2, ... as written by logrotate) and the closed
+segments listed in LOG.manifest.json (see log_segments) are queried
+together with LOG as one series.
+"""
+import glob
+import os
+import threading
+
+import numpy as np
+
+from log_segments import COMPRESSIONS, CompressedSegment, Manifest, read_segment, unlisted_segments
+from pressure_io import (MAX_LINE_BYTES, GrowableArray, LoadCancelled, atomic_write, concat_parts,
+                         file_columns, iter_csv, parse_csv_bytes, read_csv)
+
+
+INDEX_BLOCK = 256 * 1024
+
+
+def index_path(log_path: str) -> str:
+    """Index file stored beside the log"""
+    return log_path + ".idx.npz"
+
+
+class LogIndex:
+    """Index of one CSV log; call refresh() before querying a growing file"""
+
+    def __init__(self, path: str, block: int = INDEX_BLOCK):
+        self.path = path
+        self.block = block
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.inode = None
+        self.size = 0
+        self.columns = None
+        self.header_bytes = 0
+        self.first_time = None
+        self.last_time = None
+        self.times = GrowableArray(256)
+        self.offsets = GrowableArray(256, dtype=np.int64)
+        self._next_block = 0
+
+    def _load(self):
+        try:
+            with np.load(index_path(self.path)) as npz:
+                st = os.stat(self.path)
+                if int(npz["inode"]) != st.st_ino or int(npz["size"]) > st.st_size \
+                        or int(npz["block"]) != self.block:
+                    return
+                self.inode = st.st_ino
+                self.size = int(npz["size"])
+                self.columns = tuple(int(c) for c in npz["columns"])
+                self.header_bytes = int(npz["header_bytes"])
+                self.times.extend(npz["times"])
+                self.offsets.extend(npz["offsets"])
+                self._next_block = int(npz["next_block"])
+                last_time = float(npz["last_time"])
+                self.last_time = None if np.isnan(last_time) else last_time
+                self.first_time = float(self.times.data[0]) if len(self.times) else None
+        except (OSError, KeyError, ValueError):
+            self._reset()
+
+    def save(self):
+        arrays = {"inode": np.array(self.inode), "size": np.array(self.size),
+                  "block": np.array(self.block), "columns": np.array(self.columns),
+                  "header_bytes": np.array(self.header_bytes), "next_block": np.array(self._next_block),
+                  "last_time": np.array(np.nan if self.last_time is None else self.last_time),
+                  "times": self.times.data, "offsets": self.offsets.data}
+        with atomic_write(index_path(self.path)) as f:
+            np.savez(f, **arrays)
+
+    def _line_at(self, f, pos: int, size: int):
+        """Return (time, line_start) of the first valid line starting at or after pos.
+
+        Time is None when the read window holds no valid line; returns None
+        when the line is not complete yet.
+        """
+        # Bajt před pos: když je to konec řádku, řádek začíná přímo na pos
+        base = self.header_bytes if pos <= self.header_bytes else pos - 1
+        f.seek(base)
+        data = f.read(min(size - base, 4 * MAX_LINE_BYTES))
+        start = 0 if base == self.header_bytes else data.find(b"\n") + 1
+        if start == 0 and base != self.header_bytes:
+            end = -1
+        else:
+            end = data.find(b"\n", start)
+        while end >= 0:
+            t, _, _ = parse_csv_bytes(data[start:end + 1], self.columns)
+            if len(t):
+                return float(t[0]), base + start
+            start = end + 1
+            end = data.find(b"\n", start)
+        if base + len(data) >= size:
+            return None
+        return None, base + len(data)
+
+    def _last_line_time(self, f, size: int):
+        f.seek(max(size - 4 * MAX_LINE_BYTES, 0))
+        data = f.read(size - f.tell())
+        end = data.rfind(b"\n")
+        if end < 0:
+            return None
+        t, _, _ = parse_csv_bytes(data[data.rfind(b"\n", 0, end) + 1:end + 1], self.columns)
+        return float(t[0]) if len(t) else None
+
+    def refresh(self):
+        """Index blocks appended since the last call, returns True if anything changed"""
+        with self._lock:
+            st = os.stat(self.path)
+            if (self.inode is not None and st.st_ino != self.inode) or st.st_size < self.size:
+                # Rotace nebo zkrácení - index znovu od začátku
+                self._reset()
+            if self.inode == st.st_ino and st.st_size == self.size:
+                return False
+            if self.inode is None:
+                self.inode = st.st_ino
+                self.columns, self.header_bytes = file_columns(self.path)
+                self._next_block = self.header_bytes
+
+            added = False
+            with open(self.path, "rb") as f:
+                while self._next_block < st.st_size:
+                    found = self._line_at(f, self._next_block, st.st_size)
+                    if found is None:
+                        # Rozepsaný řádek na konci - zkusí se příště
+                        break
+                    t, offset = found
+                    if t is not None and (not len(self.offsets) or offset > self.offsets.data[-1]):
+                        self.times.append(t)
+                        self.offsets.append(offset)
+                        added = True
+                    self._next_block = max(self._next_block + self.block, offset + 1)
+                self.last_time = self._last_line_time(f, st.st_size)
+            self.first_time = float(self.times.data[0]) if len(self.times) else None
+            self.size = st.st_size
+
+            if added:
+                try:
+                    self.save()
+                except OSError as e:
+                    print(f"Error saving log index: {e}")
+            return True
+
+    def byte_range(self, start: float = None, end: float = None):
+        """Byte range (lo, hi) of the log that holds all rows with start <= time <= end"""
+        times = self.times.data
+        lo = self.header_bytes
+        if start is not None:
+            i = int(np.searchsorted(times, start, side="left")) - 1
+            if i >= 0:
+                lo = int(self.offsets.data[i])
+        hi = self.size
+        if end is not None:
+            i = int(np.searchsorted(times, end, side="right"))
+            if i < len(times):
+                hi = int(self.offsets.data[i])
+        return lo, hi
+
+    def query(self, start: float = None, end: float = None):
+        """Return (timestamps, pressures, bad_rows) with start <= time <= end"""
+        with self._lock:
+            lo, hi = self.byte_range(start, end)
+            columns = self.columns
+            final = hi < self.size
+        times = []
+        pressures = []
+        bad_rows = 0
+        # Rozepsaný poslední řádek logu se nečte
+        for t, p, bad, _ in iter_csv(self.path, lo, hi, columns=columns, final=final):
+            times.append(t)
+            pressures.append(p)
+            bad_rows += bad
+        times = concat_parts(times)
+        pressures = concat_parts(pressures)
+
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        return times[mask], pressures[mask], bad_rows
+
+
+def rotated_paths(path: str):
+    """The log and its rotated predecessors (LOG.1, LOG.2, ...)"""
+    paths = [p for p in glob.glob(glob.escape(path) + ".*")
+             if os.path.splitext(p)[1][1:].isdigit()]
+    if os.path.exists(path):
+        paths.append(path)
+    return paths
+
+
+class LogSeries:
+    """The log, its rotated files and closed segments as one time series"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest = Manifest(path)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def segments(self):
+        """Up-to-date indexes of all files, oldest first.
+
+        Compressed segments come from the manifest and are not read here.
+        """
+        with self._lock:
+            closed = self.manifest.load()
+            compressed = [CompressedSegment(entry) for entry in closed if entry["compressed"]]
+            # Nezkomprimované segmenty, i ty, které logger ještě nezapsal do manifestu
+            paths = (rotated_paths(self.path) + [entry["path"] for entry in closed if not entry["compressed"]]
+                     + unlisted_segments(self.path, closed))
+            for stale in set(self._indexes) - set(paths):
+                del self._indexes[stale]
+            for p in paths:
+                if p not in self._indexes:
+                    self._indexes[p] = LogIndex(p)
+            indexes = list(self._indexes.values())
+
+        for index in indexes:
+            index.refresh()
+        indexes = [i for i in indexes if i.first_time is not None] + compressed
+        return sorted(indexes, key=lambda i: i.first_time)
+
+    def has_segments(self) -> bool:
+        """True when the log is rotated into segments by RotatingCsvLogger"""
+        closed = self.manifest.load()
+        return bool(closed or unlisted_segments(self.path, closed))
+
+    def overlapping(self, start: float = None, end: float = None):
+        """Segments that may hold rows with start <= time <= end"""
+        for index in self.segments():
+            if end is not None and index.first_time > end:
+                continue
+            if start is not None and index.last_time is not None and index.last_time < start:
+                continue
+            yield index
+
+    def query(self, start: float = None, end: float = None):
+        """Return (timestamps, pressures, bad_rows) across all files"""
+        try:
+            return self._query(start, end)
+        except FileNotFoundError:
+            # Segment se mezitím zkomprimoval - manifest už ukazuje na nový soubor
+            return self._query(start, end)
+
+    def read(self, start: float = None, end: float = None, progress=None, cancelled=None):
+        """query() for the viewers: progress(done, total) in bytes after every segment.
+
+        Raises LoadCancelled when `cancelled()` returns True.
+        """
+        segments = list(self.overlapping(start, end))
+        total = sum(segment.size for segment in segments)
+        done = 0
+        times = []
+        pressures = []
+        bad_rows = 0
+        for segment in segments:
+            if cancelled is not None and cancelled():
+                raise LoadCancelled(self.path)
+            t, p, bad = segment.query(start, end)
+            times.append(t)
+            pressures.append(p)
+            bad_rows += bad
+            done += segment.size
+            if progress is not None:
+                progress(done, total)
+        return concat_parts(times), concat_parts(pressures), bad_rows
+
+    def _query(self, start, end):
+        times = []
+        pressures = []
+        bad_rows = 0
+        for index in self.overlapping(start, end):
+            t, p, bad = index.query(start, end)
+            times.append(t)
+            pressures.append(p)
+            bad_rows += bad
+        return concat_parts(times), concat_parts(pressures), bad_rows
+
+
+_series = {}
+_series_lock = threading.Lock()
+
+
+def open_series(path: str) -> LogSeries:
+    """Shared LogSeries for `path` (indexes are kept between requests)"""
+    path = os.path.abspath(path)
+    with _series_lock:
+        if path not in _series:
+            _series[path] = LogSeries(path)
+        return _series[path]
+
+
+def read_log(path: str, progress=None, cancelled=None):
+    """Read a whole log: a single CSV, a compressed segment, or LOG with its segments.
+
+    Returns (timestamps, pressures, bad_rows), see read_csv.
+    """
+    if path.endswith(tuple(COMPRESSIONS.values())):
+        return read_segment(path, cancelled)
+    series = LogSeries(path)
+    if series.has_segments():
+        return series.read(progress=progress, cancelled=cancelled)
+    return read_csv(path, progress=progress, cancelled=cancelled)
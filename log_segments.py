@@ -0,0 +1,252 @@
+"""Closed segments of a rotated pressure log and their manifest.
+
+RotatingCsvLogger (pressure_logger) keeps writing the active log LOG.
+When a segment is closed it is renamed with the time of its first sample
+(spce_pressure-20261015-000000.csv) and compressed on a background
+thread. LOG.manifest.json lists the closed segments:
+
+    {"segments": [{"file": "spce_pressure-20261015-000000.csv.gz",
+                   "start": 1760479200.0, "end": 1760565599.5,
+                   "rows": 172800, "bytes": 1130496, "compressed": "gzip"}]}
+
+Readers take the time range of a segment from the manifest, so only the
+segments that overlap a requested window are decompressed.
+"""
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from pressure_io import (CHUNK_BYTES, MAX_LINE_BYTES, LoadCancelled, atomic_write, file_columns,
+                         header_columns, parse_csv_bytes)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Komprese uzavřených segmentů -> přípona souboru
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+# Kolik rozbalených segmentů držet v paměti (den při 2 Hz je asi 3 MB)
+DECODED_SEGMENTS = 8
+
+
+def manifest_path(log_path: str) -> str:
+    """Manifest stored beside the active log"""
+    return log_path + ".manifest.json"
+
+
+def segment_path(log_path: str, start: float) -> str:
+    """Unused name for a closed segment of `log_path` starting at `start`"""
+    root, ext = os.path.splitext(log_path)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(start))
+    path = f"{root}-{stamp}{ext}"
+    n = 1
+    while any(os.path.exists(path + suffix) for suffix in ("", *COMPRESSIONS.values())):
+        path = f"{root}-{stamp}-{n}{ext}"
+        n += 1
+    return path
+
+
+def unlisted_segments(log_path: str, entries) -> list:
+    """Renamed segments not in the manifest `entries` yet (being closed, or the writer stopped)"""
+    root, ext = os.path.splitext(log_path)
+    listed = {entry["path"] for entry in entries}
+    # Originál zkomprimovaného segmentu, než ho close_segment smaže
+    listed.update(os.path.splitext(p)[0] for p in list(listed) if p.endswith(tuple(COMPRESSIONS.values())))
+    paths = glob.glob(glob.escape(root) + "-[0-9]*" + glob.escape(ext))
+    return sorted(os.path.abspath(p) for p in paths if os.path.abspath(p) not in listed)
+
+
+def check_compression(compression):
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {tuple(COMPRESSIONS)} or None, got {compression!r}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+
+
+class Manifest:
+    """Closed segments of one log, oldest first"""
+
+    def __init__(self, log_path: str):
+        self.log_path = log_path
+        self.path = manifest_path(log_path)
+        self.directory = os.path.dirname(os.path.abspath(log_path))
+        self._lock = threading.Lock()
+
+    def load(self) -> list:
+        """Segment entries sorted by start time, with the absolute "path" added"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                segments = json.load(f)["segments"]
+        except FileNotFoundError:
+            return []
+        except (ValueError, KeyError) as e:
+            print(f"Error reading manifest {self.path}: {e}")
+            return []
+        for entry in segments:
+            entry["path"] = os.path.join(self.directory, entry["file"])
+        return sorted(segments, key=lambda entry: entry["start"])
+
+    def put(self, entry: dict, replace: str = None):
+        """Add a segment entry, or replace the one for file `replace`"""
+        with self._lock:
+            name = replace or entry["file"]
+            segments = [s for s in self.load() if s["file"] != name]
+            segments.append(entry)
+            segments = [{k: v for k, v in s.items() if k != "path"} for s in segments]
+            with atomic_write(self.path, "w", encoding="utf-8") as f:
+                json.dump({"segments": sorted(segments, key=lambda s: s["start"])}, f, indent=1)
+
+
+def open_segment(path: str):
+    """Binary stream of a segment, decompressed according to its extension"""
+    if path.endswith(COMPRESSIONS["gzip"]):
+        return gzip.open(path, "rb")
+    if path.endswith(COMPRESSIONS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} needs the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def iter_segment(path: str, chunk_bytes: int = CHUNK_BYTES):
+    """Parse a (compressed) segment in chunks, yields (timestamps, pressures, bad_rows)"""
+    with open_segment(path) as f:
+        columns = None
+        pending = b""
+        while True:
+            block = f.read(chunk_bytes)
+            data = pending + block
+            if columns is None:
+                end = data.find(b"\n")
+                if end < 0 and block:
+                    pending = data
+                    continue
+                end = len(data) if end < 0 else end
+                columns = header_columns(data[:end].decode("utf-8", errors="replace"))
+                if columns is None:
+                    columns = (1, 0)
+                else:
+                    data = data[end + 1:]
+            cut = data.rfind(b"\n") + 1 if block else len(data)
+            pending = data[cut:]
+            if cut:
+                yield parse_csv_bytes(data[:cut], columns)
+            if not block:
+                break
+
+
+def read_segment(path: str, cancelled=None):
+    """Return (timestamps, pressures, bad_rows) of a whole segment.
+
+    Raises LoadCancelled when `cancelled()` returns True.
+    """
+    times = []
+    pressures = []
+    bad_rows = 0
+    for t, p, bad in iter_segment(path):
+        times.append(t)
+        pressures.append(p)
+        bad_rows += bad
+        if cancelled is not None and cancelled():
+            raise LoadCancelled(path)
+    if not times:
+        return np.empty(0), np.empty(0), bad_rows
+    return np.concatenate(times), np.concatenate(pressures), bad_rows
+
+
+def first_sample_time(path: str):
+    """Time of the first valid row of a CSV log, None while it has none"""
+    columns, header_bytes = file_columns(path)
+    with open(path, "rb") as f:
+        f.seek(header_bytes)
+        data = f.read(4 * MAX_LINE_BYTES)
+    t, _, _ = parse_csv_bytes(data[:data.rfind(b"\n") + 1], columns)
+    return float(t[0]) if len(t) else None
+
+
+def compress_file(path: str, compression: str) -> str:
+    """Write a compressed copy of `path`, returns its name (the original is kept)"""
+    target = path + COMPRESSIONS[compression]
+    with open(path, "rb") as src, atomic_write(target) as dst:
+        if compression == "zstd":
+            zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+        else:
+            with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6) as gz:
+                shutil.copyfileobj(src, gz, CHUNK_BYTES)
+    return target
+
+
+def close_segment(manifest: Manifest, path: str, compression: str = "gzip"):
+    """List a renamed segment in the manifest and compress it"""
+    times, _, _ = read_segment(path)
+    if not len(times):
+        os.remove(path)
+        return
+    entry = dict(file=os.path.basename(path), start=float(times.min()), end=float(times.max()),
+                 rows=len(times), bytes=os.path.getsize(path), compressed=None)
+    manifest.put(entry)
+    if compression is None:
+        return
+    target = compress_file(path, compression)
+    manifest.put(dict(entry, file=os.path.basename(target), bytes=os.path.getsize(target),
+                      compressed=compression), replace=entry["file"])
+    # Čtenář s právě načteným starým manifestem to zkusí znovu
+    os.remove(path)
+    # Index a pyramida původního souboru (LOG-....csv.idx.npz) už nic nepopisují
+    for sidecar in glob.glob(glob.escape(path) + ".*.npz"):
+        os.remove(sidecar)
+
+
+_decoded = OrderedDict()
+_decoded_lock = threading.Lock()
+
+
+def _decoded_segment(path: str):
+    """Parsed arrays of a compressed segment, kept for the next queries"""
+    key = (path, os.stat(path).st_mtime_ns)
+    with _decoded_lock:
+        if key in _decoded:
+            _decoded.move_to_end(key)
+            return _decoded[key]
+    times, pressures, bad_rows = read_segment(path)
+    times.flags.writeable = False
+    pressures.flags.writeable = False
+    with _decoded_lock:
+        _decoded[key] = (times, pressures, bad_rows)
+        while len(_decoded) > DECODED_SEGMENTS:
+            _decoded.popitem(last=False)
+    return times, pressures, bad_rows
+
+
+class CompressedSegment:
+    """Compressed segment from the manifest, queried like a LogIndex"""
+
+    def __init__(self, entry: dict):
+        self.path = entry["path"]
+        self.first_time = entry["start"]
+        self.last_time = entry["end"]
+        self.rows = entry["rows"]
+        self.size = entry["bytes"]
+
+    def refresh(self):
+        return False
+
+    def query(self, start: float = None, end: float = None):
+        """Return (timestamps, pressures, bad_rows) with start <= time <= end"""
+        times, pressures, bad_rows = _decoded_segment(self.path)
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        return times[mask], pressures[mask], bad_rows
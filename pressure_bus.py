@@ -0,0 +1,254 @@
+"""Local publish/subscribe transport for pressure samples.
+
+The collector publishes every sample once; viewers subscribe over a Unix
+domain socket (or a TCP socket bound to 127.0.0.1 where Unix sockets are
+not available). Each sample is one ASCII line "epoch,pressure,addr\\n"
+with the controller's bus address (decimal). A subscriber follows one
+controller: the address it was given, or the first one it receives.
+The CSV log stays the durable record, the bus only carries live data.
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from pressure_io import RingBuffer
+
+
+# ALARM_ADDRESS: zprávy alarmů (JSON řádky), viz alarms.py
+if hasattr(socket, "AF_UNIX") and os.name != "nt":
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "spce_pressure.sock")
+    ALARM_ADDRESS = os.path.join(tempfile.gettempdir(), "spce_alarms.sock")
+else:
+    DEFAULT_ADDRESS = ("127.0.0.1", 5009)
+    ALARM_ADDRESS = ("127.0.0.1", 5010)
+
+# Odběratel, který nestíhá číst, se odpojí, když mu naroste fronta
+MAX_PENDING_BYTES = 1024 * 1024
+
+
+def _family(address):
+    return socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+
+
+class BusPublisher:
+    """Accepts local subscribers and sends them every published sample"""
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.address = address
+        self.dropped_subscribers = 0
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+        self._server = socket.socket(_family(address), socket.SOCK_STREAM)
+        if isinstance(address, str):
+            # Socket po předchozím běhu
+            if os.path.exists(address):
+                os.unlink(address)
+        else:
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen()
+        self._closed = False
+        self._thread = threading.Thread(target=self._accept_loop, name="bus-accept", daemon=True)
+        self._thread.start()
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            conn.setblocking(False)
+            if conn.family == socket.AF_INET:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._subscribers[conn] = bytearray()
+
+    def publish(self, timestamp: float, pressure: float, addr: int = 0):
+        self.publish_line(f"{timestamp:.6f},{pressure!r},{addr:d}\n".encode("ascii"))
+
+    def publish_line(self, line: bytes):
+        """Send one complete line (ending with \\n) to every subscriber"""
+        with self._lock:
+            for conn, pending in list(self._subscribers.items()):
+                pending += line
+                try:
+                    sent = conn.send(pending)
+                    del pending[:sent]
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self._drop(conn)
+                    continue
+                if len(pending) > MAX_PENDING_BYTES:
+                    self._drop(conn)
+
+    def _drop(self, conn):
+        self._subscribers.pop(conn, None)
+        self.dropped_subscribers += 1
+        conn.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            for conn in self._subscribers:
+                conn.close()
+            self._subscribers.clear()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class BusSubscriber:
+    """Non-blocking subscriber; call poll() from a timer or a loop.
+
+    Reconnects on its own (at most once per `retry_interval` seconds) when
+    the publisher is not running yet or went away. Only samples of the
+    controller `device` are returned; with device=None it is the address of
+    the first sample received.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, retry_interval: float = 1.0, device: int = None):
+        self.address = address
+        self.retry_interval = retry_interval
+        self.device = device
+        self._sock = None
+        self._buf = b""
+        self._last_attempt = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def _connect(self):
+        now = time.monotonic()
+        if now - self._last_attempt < self.retry_interval:
+            return
+        self._last_attempt = now
+        sock = socket.socket(_family(self.address), socket.SOCK_STREAM)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            return
+        sock.setblocking(False)
+        self._sock = sock
+        self._buf = b""
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._buf = b""
+
+    def poll(self):
+        """Return (timestamps, pressures) received since the last call"""
+        if self._sock is None:
+            self._connect()
+            if self._sock is None:
+                return np.empty(0), np.empty(0)
+
+        chunks = []
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                self._disconnect()
+                break
+            if not data:
+                self._disconnect()
+                break
+            chunks.append(data)
+
+        if not chunks:
+            return np.empty(0), np.empty(0)
+        data = self._buf + b"".join(chunks)
+        end = data.rfind(b"\n")
+        if end < 0:
+            self._buf = data
+            return np.empty(0), np.empty(0)
+        self._buf = data[end + 1:]
+
+        values = np.array(data[:end].replace(b"\n", b",").split(b","), dtype=np.float64).reshape(-1, 3)
+        # Víc regulátorů na jedné sběrnici - jedna křivka jen z jednoho z nich
+        if self.device is None:
+            self.device = int(values[0, 2])
+        values = values[values[:, 2] == self.device]
+        return values[:, 0], values[:, 1]
+
+    def close(self):
+        self._disconnect()
+
+
+class BusFeed:
+    """Subscriber running in a background thread that keeps the latest samples.
+
+    Meant for request handlers (web server): every stored sample gets a
+    sequence number, `since(seq)` returns the samples after it.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, capacity: int = 10000, interval: float = 0.02,
+                 device: int = None):
+        self.subscriber = BusSubscriber(address, device=device)
+        self.interval = interval
+        self.seq = 0
+        self._times = RingBuffer(capacity)
+        self._values = RingBuffer(capacity)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bus-feed", daemon=True)
+
+    @property
+    def connected(self) -> bool:
+        return self.subscriber.connected
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            timestamps, pressures = self.subscriber.poll()
+            if len(timestamps):
+                with self._lock:
+                    self._times.extend(timestamps)
+                    self._values.extend(pressures)
+                    self.seq += len(timestamps)
+
+    def since(self, seq: int):
+        """Return (seq, timestamps, pressures, complete) for samples after `seq`.
+
+        `complete` is False when some samples after `seq` were already
+        overwritten; seq < 0 only returns the current sequence number.
+        """
+        with self._lock:
+            n = self.seq - seq if seq >= 0 else 0
+            available = len(self._times)
+            complete = n <= available
+            n = max(0, min(n, available))
+            times = self._times.data[available - n:].copy()
+            values = self._values.data[available - n:].copy()
+            return self.seq, times, values, complete
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.subscriber.close()
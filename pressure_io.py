@@ -0,0 +1,430 @@
+import calendar
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import counter, histogram
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+PARSE_SECONDS = histogram("csv_parse_seconds", "Parsing one block of CSV lines")
+ROWS_PARSED = counter("csv_rows_parsed_total", "Valid CSV rows parsed")
+BAD_ROWS = counter("csv_bad_rows_total", "Invalid CSV rows skipped")
+
+# Soubor se čte a parsuje po blocích této velikosti
+CHUNK_BYTES = 8 * 1024 * 1024
+# Delší řádek je určitě poškozený (a zbytečně by zvětšil pole řetězců)
+MAX_LINE_BYTES = 256
+
+
+class LoadCancelled(Exception):
+    """Loading was cancelled before the whole file was read"""
+
+
+def format_timestamp(epoch: float) -> str:
+    """Local time of a sample with milliseconds, e.g. "2025-12-03 17:30:50.250" """
+    ms = int(round(epoch * 1000))
+    return time.strftime(TIME_FORMAT, time.localtime(ms // 1000)) + f".{ms % 1000:03d}"
+
+
+class GrowableArray:
+    """Preallocated NumPy buffer that doubles its capacity when it fills up"""
+
+    def __init__(self, capacity: int = 4096, dtype=np.float64):
+        self._buf = np.empty(max(1, capacity), dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._buf.nbytes
+
+    @property
+    def data(self) -> np.ndarray:
+        """View of the filled part of the buffer (no copy)"""
+        return self._buf[:self._size]
+
+    def _reserve(self, needed: int):
+        if needed <= len(self._buf):
+            return
+        capacity = len(self._buf)
+        while capacity < needed:
+            capacity *= 2
+        new_buf = np.empty(capacity, dtype=self._buf.dtype)
+        new_buf[:self._size] = self._buf[:self._size]
+        self._buf = new_buf
+
+    def append(self, value):
+        self._reserve(self._size + 1)
+        self._buf[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._buf.dtype)
+        n = len(values)
+        if n == 0:
+            return
+        self._reserve(self._size + n)
+        self._buf[self._size:self._size + n] = values
+        self._size += n
+
+    def clear(self):
+        self._size = 0
+
+
+class RingBuffer:
+    """Fixed-capacity NumPy ring buffer keeping the most recent values.
+
+    Every value is stored twice (at i and i + capacity), so the contents
+    are always available as one contiguous view without copying.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        self.capacity = max(1, int(capacity))
+        self._buf = np.empty(2 * self.capacity, dtype=dtype)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def data(self) -> np.ndarray:
+        """Oldest to newest values as a view (no copy)"""
+        return self._buf[self._start:self._start + self._size]
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._buf.dtype)
+        n = len(values)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            values = values[-self.capacity:]
+            self._buf[:self.capacity] = values
+            self._buf[self.capacity:] = values
+            self._start = 0
+            self._size = self.capacity
+            return
+
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        for offset in (0, self.capacity):
+            self._buf[offset + end:offset + end + first] = values[:first]
+            self._buf[offset:offset + n - first] = values[first:]
+
+        overflow = max(0, self._size + n - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self.capacity, self._size + n)
+
+    def append(self, value):
+        self.extend([value])
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+
+def nearest_index(x: np.ndarray, value: float) -> int:
+    """Index of the sample in sorted `x` closest to `value` (binary search)"""
+    n = len(x)
+    if n == 0:
+        return -1
+    i = int(np.searchsorted(x, value))
+    if i == 0:
+        return 0
+    if i == n:
+        return n - 1
+    return i if x[i] - value < value - x[i - 1] else i - 1
+
+
+class CsvTailReader:
+    """Follows a growing pressure CSV and parses only newly appended lines.
+
+    The reader remembers the byte offset and inode of the file. When the file
+    is truncated or replaced (log rotation) it starts again from the beginning
+    and reports a reset so the caller can drop the data it already holds.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.offset = 0
+        self.inode = None
+        self.bad_rows = 0
+        self._columns = None
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.bad_rows = 0
+        self._columns = None
+
+    @property
+    def cursor(self) -> str:
+        """Opaque position "inode:offset" that can be handed to seek_cursor later"""
+        return f"{self.inode}:{self.offset}"
+
+    def seek_cursor(self, cursor: str):
+        """Continue reading from a position returned by `cursor`"""
+        inode, offset = cursor.split(":")
+        self.reset()
+        self.inode = int(inode)
+        self.offset = int(offset)
+
+    def read_new(self, progress=None, cancelled=None):
+        """Return (timestamps, pressures, reset) for lines appended since the last call.
+
+        `progress(done, total)` gets byte counts after every chunk. When
+        `cancelled()` returns True the read stops after the current chunk;
+        the rest is read by the next call.
+        """
+        st = os.stat(self.filename)
+        reset = False
+        if (self.inode is not None and st.st_ino != self.inode) or st.st_size < self.offset:
+            self.reset()
+            reset = True
+        self.inode = st.st_ino
+
+        if st.st_size == self.offset:
+            return np.empty(0), np.empty(0), reset
+
+        if self._columns is None and self.offset > 0:
+            # Hlavička už je celá přečtená
+            self._columns, _ = file_columns(self.filename)
+
+        # Zpracuj jen kompletní řádky, rozepsaný konec počká na další čtení
+        times = []
+        pressures = []
+        start = self.offset
+        for t, p, bad, offset in iter_csv(self.filename, self.offset, st.st_size,
+                                          columns=self._columns, final=False):
+            times.append(t)
+            pressures.append(p)
+            self.bad_rows += bad
+            self.offset = offset
+            if progress is not None:
+                progress(offset - start, st.st_size - start)
+            if cancelled is not None and cancelled():
+                break
+        return concat_parts(times), concat_parts(pressures), reset
+
+
+def header_columns(line: str):
+    """Return (time_col, pressure_col) from a CSV header line, or None if it is not a header"""
+    names = [name.strip() for name in line.split(",")]
+    try:
+        return names.index("time"), names.index("pressure")
+    except ValueError:
+        return None
+
+
+def file_columns(filename: str):
+    """Return ((time_col, pressure_col), header_bytes) for a CSV file.
+
+    Files without a header use the column order of SPCe.save_to_csv and
+    header_bytes is 0.
+    """
+    with open(filename, "rb") as f:
+        first = f.readline(MAX_LINE_BYTES * 4)
+    columns = header_columns(first.decode("utf-8", errors="replace"))
+    if columns is None:
+        return (1, 0), 0
+    return columns, len(first)
+
+
+def concat_parts(parts):
+    """One array from a list of parsed blocks (no copy for a single block)"""
+    if not parts:
+        return np.empty(0)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb", **kwargs):
+    """Open a temporary file that replaces `path` when the block ends.
+
+    Readers never see a half-written file and a crash leaves the old one.
+    The data is on disk (fsync) before the file is replaced.
+    """
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def _field(lines: np.ndarray, index: int) -> np.ndarray:
+    """Column `index` of comma separated lines (empty where the line is too short)"""
+    for _ in range(index):
+        lines = np.char.partition(lines, b",")[:, 2]
+    return np.char.strip(np.char.partition(lines, b",")[:, 0])
+
+
+def _convert(values: np.ndarray, dtype):
+    """Convert a bytes array to `dtype`, returns (result, valid_mask)"""
+    try:
+        return values.astype(dtype), np.ones(len(values), dtype=bool)
+    except ValueError:
+        pass
+    # Blok obsahuje vadné hodnoty - převeď je po jedné
+    result = np.zeros(len(values), dtype=dtype)
+    valid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            result[i] = np.array(value).astype(dtype)
+            valid[i] = True
+        except ValueError:
+            pass
+    return result, valid
+
+
+def _utc_offsets(seconds: np.ndarray, from_local: bool) -> np.ndarray:
+    """Local UTC offset in seconds for each timestamp, looked up once per hour.
+
+    With from_local the timestamps are local wall-clock times (as if they
+    were UTC), otherwise they are epoch seconds.
+    """
+    hours = np.floor_divide(seconds, 3600.0)
+    if len(hours) == 0:
+        return np.empty(0)
+    # Data jsou seřazená podle času, takže hodin je málo
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(hours)) + 1])
+    cache = {}
+    run_offsets = np.empty(len(starts))
+    for i, hour in enumerate(hours[starts]):
+        if hour not in cache:
+            s = int(hour) * 3600
+            if from_local:
+                cache[hour] = s - time.mktime(time.gmtime(s)[:8] + (-1,))
+            else:
+                cache[hour] = calendar.timegm(time.localtime(s)) - s
+        run_offsets[i] = cache[hour]
+    return np.repeat(run_offsets, np.diff(np.append(starts, len(hours))))
+
+
+def parse_local_times(values: np.ndarray):
+    """Parse "YYYY-MM-DD HH:MM:SS[.fff]" local times to epoch seconds.
+
+    Returns (timestamps, valid_mask); the conversion is vectorized.
+    """
+    try:
+        # Převod z bytes přímo na datetime64 při chybě padá (NumPy 2.x)
+        values = values.astype(str)
+    except UnicodeDecodeError:
+        values = np.char.decode(values, "ascii", errors="replace")
+    stamps, valid = _convert(values, "datetime64[us]")
+    valid &= ~np.isnat(stamps)
+    wall = stamps.astype(np.int64) / 1e6
+    wall[~valid] = 0.0
+    return wall - _utc_offsets(wall, from_local=True), valid
+
+
+def format_local_times(timestamps, unit: str = "s") -> np.ndarray:
+    """Format epoch seconds as local "YYYY-MM-DD HH:MM:SS" strings (vectorized)"""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(timestamps) == 0:
+        # np.char.replace prázdné pole neumí (NumPy 2)
+        return np.empty(0, dtype="<U19")
+    wall = timestamps + _utc_offsets(timestamps, from_local=False)
+    stamps = (wall * 1e6).astype(np.int64).astype("datetime64[us]")
+    return np.char.replace(np.datetime_as_string(stamps, unit=unit), "T", " ")
+
+
+def parse_csv_bytes(data: bytes, columns=(1, 0)):
+    """Parse complete CSV data lines into (timestamps, pressures, bad_row_count)"""
+    with PARSE_SECONDS.time():
+        timestamps, pressures, bad = _parse_csv_bytes(data, columns)
+    ROWS_PARSED.inc(len(timestamps))
+    if bad:
+        BAD_ROWS.inc(bad)
+    return timestamps, pressures, bad
+
+
+def _parse_csv_bytes(data: bytes, columns):
+    time_col, pressure_col = columns
+    parts = data.split(b"\n")
+    bad = 0
+    if max(map(len, parts), default=0) > MAX_LINE_BYTES:
+        bad = sum(len(line) > MAX_LINE_BYTES for line in parts)
+        parts = [line for line in parts if len(line) <= MAX_LINE_BYTES]
+
+    lines = np.char.strip(np.array(parts, dtype=bytes))
+    lines = lines[np.char.str_len(lines) > 0]
+    if len(lines) == 0:
+        return np.empty(0), np.empty(0), bad
+
+    timestamps, time_ok = parse_local_times(_field(lines, time_col))
+    pressures, pressure_ok = _convert(_field(lines, pressure_col), np.float64)
+    valid = time_ok & pressure_ok
+    bad += int(len(valid) - valid.sum())
+    if bad:
+        timestamps = timestamps[valid]
+        pressures = pressures[valid]
+    return timestamps, pressures, bad
+
+
+def iter_csv(filename: str, start: int = 0, end: int = None, columns=None,
+             chunk_bytes: int = CHUNK_BYTES, final: bool = True):
+    """Parse the byte range start..end of a pressure CSV in chunks.
+
+    Yields (timestamps, pressures, bad_row_count, offset) per chunk, `offset`
+    is the position after the last parsed line. `start` must be at the
+    beginning of a line. With final=False an unterminated last line is left
+    for a later call (the file is still being written).
+    """
+    if columns is None or start == 0:
+        detected, header_bytes = file_columns(filename)
+        columns = columns or detected
+        start = max(start, header_bytes)
+    if end is None:
+        end = os.path.getsize(filename)
+
+    with open(filename, "rb") as f:
+        f.seek(start)
+        offset = start
+        pending = b""
+        while offset < end:
+            block = f.read(min(chunk_bytes, end - offset))
+            if not block:
+                break
+            offset += len(block)
+            data = pending + block
+            cut = data.rfind(b"\n") + 1
+            if offset >= end and final:
+                cut = len(data)
+            pending = data[cut:]
+            if cut:
+                t, p, bad = parse_csv_bytes(data[:cut], columns)
+                yield t, p, bad, offset - len(pending)
+
+
+def read_csv(filename: str, start: int = 0, end: int = None, progress=None, cancelled=None):
+    """Read a pressure CSV (or the byte range start..end of it).
+
+    Returns (timestamps, pressures, bad_row_count). `progress(done, total)`
+    is called with byte counts after every chunk; when `cancelled()` returns
+    True, LoadCancelled is raised.
+    """
+    if end is None:
+        end = os.path.getsize(filename)
+    times = []
+    pressures = []
+    bad_rows = 0
+    for t, p, bad, offset in iter_csv(filename, start, end):
+        times.append(t)
+        pressures.append(p)
+        bad_rows += bad
+        if progress is not None:
+            progress(offset - start, end - start)
+        if cancelled is not None and cancelled():
+            raise LoadCancelled(filename)
+    return concat_parts(times), concat_parts(pressures), bad_rows
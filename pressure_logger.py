@@ -0,0 +1,271 @@
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from log_segments import (Manifest, check_compression, close_segment, first_sample_time, segment_path,
+                          unlisted_segments)
+from metrics import counter, histogram
+from pressure_store import BinaryLogWriter
+
+
+FSYNC_POLICIES = ("never", "flush", "close")
+
+FLUSH_SECONDS = histogram("logger_flush_seconds", "Writing buffered rows including fsync", ["format"])
+FSYNC_SECONDS = histogram("logger_fsync_seconds", "os.fsync of the log", ["format"])
+ROWS_WRITTEN = counter("logger_rows_total", "Rows written to the log", ["format"])
+ROTATIONS = counter("logger_rotations_total", "Closed log segments")
+
+
+class CsvLogger:
+    """Keeps one CSV writer open and writes buffered rows in batches.
+
+    Rows are flushed when `flush_rows` rows are waiting or `flush_interval`
+    seconds passed since the last flush. `fsync` decides when data is forced
+    to the disk: "never", on every "flush" or only on "close".
+    """
+
+    fields = ["pressure", "time"]
+
+    def __init__(self, filename: str, flush_rows: int = 10, flush_interval: float = 1.0,
+                 fsync: str = "flush", fields=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.filename = filename
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        if fields is not None:
+            self.fields = list(fields)
+        self._rows = []
+        self._last_flush = time.monotonic()
+
+        self._file = open(filename, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fields, extrasaction="ignore")
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    @property
+    def size(self) -> int:
+        """Bytes written to the file so far (rows still buffered not included)"""
+        return self._file.tell()
+
+    def write(self, record: dict):
+        self._rows.append(record)
+        if (len(self._rows) >= self.flush_rows
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with FLUSH_SECONDS.time(format="csv"):
+            if self._rows:
+                self._writer.writerows(self._rows)
+                ROWS_WRITTEN.inc(len(self._rows), format="csv")
+                self._rows.clear()
+            self._file.flush()
+            if self.fsync == "flush":
+                with FSYNC_SECONDS.time(format="csv"):
+                    os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+            if self.fsync == "close":
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BinaryLogger:
+    """Same interface as CsvLogger, but writes the binary columnar format.
+
+    Records need an "epoch" key with the sample time as a Unix timestamp.
+    Every flush appends one chunk.
+    """
+
+    def __init__(self, filename: str, flush_rows: int = 10, flush_interval: float = 1.0,
+                 fsync: str = "flush"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.filename = filename
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._times = []
+        self._pressures = []
+        self._last_flush = time.monotonic()
+        self._writer = BinaryLogWriter(filename)
+        self._closed = False
+
+    def write(self, record: dict):
+        self._times.append(record["epoch"])
+        self._pressures.append(float(record["pressure"]))
+        if (len(self._times) >= self.flush_rows
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with FLUSH_SECONDS.time(format="bin"):
+            if self._times:
+                self._writer.write_chunk(self._times, self._pressures)
+                ROWS_WRITTEN.inc(len(self._times), format="bin")
+                self._times.clear()
+                self._pressures.clear()
+            self._writer.flush()
+            if self.fsync == "flush":
+                with FSYNC_SECONDS.time(format="bin"):
+                    os.fsync(self._writer.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+            if self.fsync == "close":
+                os.fsync(self._writer.fileno())
+        finally:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RotatingCsvLogger:
+    """CsvLogger that starts a new segment by size or by time.
+
+    The active segment is always `filename`, so tail readers keep working.
+    A segment is closed when it reaches `max_bytes` or when a sample falls
+    into the next `max_age` period (aligned to local time, 86400 rotates at
+    midnight). Closed segments are renamed, compressed on a background
+    thread and listed in the manifest, see log_segments. Records need an
+    "epoch" key.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = None, max_age: float = None,
+                 compression: str = "gzip", **kwargs):
+        check_compression(compression)
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compression = compression
+        self.manifest = Manifest(filename)
+        self._kwargs = kwargs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-segments")
+
+        # Segmenty přejmenované před pádem ještě nejsou v manifestu
+        for path in unlisted_segments(filename, self.manifest.load()):
+            self._executor.submit(self._close_segment, path)
+
+        self._logger = CsvLogger(filename, **kwargs)
+        self._segment_start = first_sample_time(filename) if self._logger.size else None
+
+    def _period(self, epoch: float) -> int:
+        return int((epoch + time.localtime(epoch).tm_gmtoff) // self.max_age)
+
+    def _due(self, epoch: float) -> bool:
+        if self._segment_start is None:
+            return False
+        if self.max_age and self._period(epoch) != self._period(self._segment_start):
+            return True
+        return bool(self.max_bytes) and self._logger.size >= self.max_bytes
+
+    def write(self, record: dict):
+        epoch = record["epoch"]
+        if self._due(epoch):
+            self.rotate()
+        if self._segment_start is None:
+            self._segment_start = epoch
+        self._logger.write(record)
+
+    def rotate(self):
+        """Close the active segment and continue in a new file"""
+        self._logger.close()
+        path = segment_path(self.filename, self._segment_start)
+        try:
+            os.replace(self.filename, path)
+        except PermissionError as e:
+            # Windows: soubor má právě otevřený čtenář, zkusí se při dalším zápisu
+            print(f"Log rotation postponed: {e}")
+            self._logger = CsvLogger(self.filename, **self._kwargs)
+            return
+        self._logger = CsvLogger(self.filename, **self._kwargs)
+        self._segment_start = None
+        ROTATIONS.inc()
+        self._executor.submit(self._close_segment, path)
+
+    def _close_segment(self, path: str):
+        try:
+            close_segment(self.manifest, path, self.compression)
+        except Exception as e:
+            print(f"Error closing log segment {path}: {e}")
+
+    def flush(self):
+        self._logger.flush()
+
+    def close(self):
+        try:
+            self._logger.close()
+        finally:
+            # Počkej na dokončení komprese
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_csv_logger(filename: str, rotate_bytes: int = None, rotate_age: float = None,
+                    compression: str = "gzip", **kwargs):
+    """CsvLogger, or RotatingCsvLogger when a rotation limit is given"""
+    if rotate_bytes or rotate_age:
+        return RotatingCsvLogger(filename, max_bytes=rotate_bytes, max_age=rotate_age,
+                                 compression=compression, **kwargs)
+    return CsvLogger(filename, **kwargs)
+
+
+def add_rotation_arguments(parser):
+    """--rotate-mb, --rotate-hours and --compress for collection scripts"""
+    parser.add_argument("--rotate-mb", type=float, help="start a new log segment after this many MB")
+    parser.add_argument("--rotate-hours", type=float, help="start a new log segment every N hours (24 = daily)")
+    parser.add_argument("--compress", choices=["gzip", "zstd", "none"], default="gzip",
+                        help="compression of closed segments")
+
+
+def rotation_args(args) -> dict:
+    """Keyword arguments of open_csv_logger from the parsed rotation options"""
+    return dict(rotate_bytes=int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None,
+                rotate_age=args.rotate_hours * 3600 if args.rotate_hours else None,
+                compression=None if args.compress == "none" else args.compress)
+
+
+def open_loggers(filename: str, fmt: str = "csv", rotate_bytes: int = None, rotate_age: float = None,
+                 compression: str = "gzip", **kwargs):
+    """Create the loggers for `fmt` ("csv", "bin" or "both").
+
+    The binary log is written next to the CSV with a .bin extension. With
+    `rotate_bytes` or `rotate_age` the CSV log is split into segments.
+    """
+    if fmt not in ("csv", "bin", "both"):
+        raise ValueError(f"fmt must be 'csv', 'bin' or 'both', got {fmt!r}")
+    loggers = []
+    if fmt in ("csv", "both"):
+        loggers.append(open_csv_logger(filename, rotate_bytes, rotate_age, compression, **kwargs))
+    if fmt in ("bin", "both"):
+        loggers.append(BinaryLogger(os.path.splitext(filename)[0] + ".bin", **kwargs))
+    return loggers
@@ -0,0 +1,152 @@
+"""Incremental statistics over the live pressure stream.
+
+Every sample costs O(1) amortized: windowed min/max come from monotonic
+deques, mean/std and the rate of rise (least-squares dP/dt) from Welford
+style running moments that support removing the oldest sample.
+"""
+import math
+from collections import deque
+
+import numpy as np
+
+
+# Okna v sekundách
+DEFAULT_WINDOWS = (60.0, 600.0)
+
+
+class RollingWindow:
+    """Statistics of the samples from the last `window` seconds.
+
+    Samples must come in time order; older ones are ignored.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.clear()
+
+    def clear(self):
+        self._samples = deque()
+        self._min = deque()
+        self._max = deque()
+        self._reset_moments()
+
+    def _reset_moments(self):
+        self.n = 0
+        # Časy relativně k prvnímu vzorku, epoch sekundy by ztrácely přesnost
+        self._origin = None
+        self._mean_t = 0.0
+        self._mean_p = 0.0
+        self._m2_t = 0.0
+        self._m2_p = 0.0
+        self._c_tp = 0.0
+
+    def add(self, t: float, p: float):
+        if self._samples and t < self._samples[-1][0]:
+            return
+        self._samples.append((t, p))
+        while self._min and self._min[-1][1] >= p:
+            self._min.pop()
+        self._min.append((t, p))
+        while self._max and self._max[-1][1] <= p:
+            self._max.pop()
+        self._max.append((t, p))
+
+        if self._origin is None:
+            self._origin = t
+        x = t - self._origin
+        self.n += 1
+        dt = x - self._mean_t
+        dp = p - self._mean_p
+        self._mean_t += dt / self.n
+        self._mean_p += dp / self.n
+        self._m2_t += dt * (x - self._mean_t)
+        self._m2_p += dp * (p - self._mean_p)
+        self._c_tp += dt * (p - self._mean_p)
+
+        cutoff = t - self.window
+        while self._samples[0][0] < cutoff:
+            self._remove(*self._samples.popleft())
+        while self._min[0][0] < cutoff:
+            self._min.popleft()
+        while self._max[0][0] < cutoff:
+            self._max.popleft()
+
+    def _remove(self, t: float, p: float):
+        if self.n == 1:
+            self._reset_moments()
+            return
+        x = t - self._origin
+        dt = x - self._mean_t
+        dp = p - self._mean_p
+        self.n -= 1
+        self._mean_t -= dt / self.n
+        self._mean_p -= dp / self.n
+        self._m2_t = max(0.0, self._m2_t - dt * (x - self._mean_t))
+        self._m2_p = max(0.0, self._m2_p - dp * (p - self._mean_p))
+        self._c_tp -= dt * (p - self._mean_p)
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    @property
+    def mean(self):
+        return self._mean_p if self.n else None
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2_p / (self.n - 1)) if self.n > 1 else None
+
+    @property
+    def dpdt(self):
+        """Rate of rise in pressure units per second (least-squares slope)"""
+        if self.n < 2 or self._m2_t <= 0:
+            return None
+        return self._c_tp / self._m2_t
+
+    def summary(self) -> dict:
+        return {"window": self.window, "count": self.n, "min": self.min, "max": self.max,
+                "mean": self.mean, "std": self.std, "dpdt": self.dpdt}
+
+
+class StreamStats:
+    """All-time min/max plus one RollingWindow per configured window"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.windows = [RollingWindow(w) for w in windows]
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.last_time = None
+        for window in self.windows:
+            window.clear()
+
+    def extend(self, timestamps, pressures):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        pressures = np.asarray(pressures, dtype=np.float64)
+        if len(timestamps) == 0:
+            return
+        self.count += len(timestamps)
+        batch_min = float(pressures.min())
+        batch_max = float(pressures.max())
+        self.min = batch_min if self.min is None else min(self.min, batch_min)
+        self.max = batch_max if self.max is None else max(self.max, batch_max)
+        self.last_time = float(timestamps[-1])
+
+        # Do oken stačí vzorky, které v nich po dávce zůstanou
+        longest = max((w.window for w in self.windows), default=0.0)
+        first = int(np.searchsorted(timestamps, self.last_time - longest, side="left"))
+        for t, p in zip(timestamps[first:].tolist(), pressures[first:].tolist()):
+            for window in self.windows:
+                window.add(t, p)
+
+    def summary(self) -> dict:
+        return {"count": self.count, "min": self.min, "max": self.max, "last_time": self.last_time,
+                "windows": [w.summary() for w in self.windows]}
@@ -0,0 +1,197 @@
+"""Binary columnar storage for pressure logs.
+
+Layout (little endian):
+
+    file header  "SPCEBIN1" | uint16 version | uint16 header size | uint32 reserved
+    chunk        "CHNK" | uint32 count | count x float64 epoch time | count x float64 pressure
+    chunk        ...
+
+Chunks are only ever appended. A chunk cut short by a crash is ignored by
+readers and cut off by the next writer.
+"""
+import argparse
+import os
+import struct
+
+import numpy as np
+
+from pressure_io import atomic_write, iter_csv
+
+
+MAGIC = b"SPCEBIN1"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sHHI")
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sI")
+
+
+def _scan_chunks(buf, size: int):
+    """Yield (data_offset, count) of every complete chunk in the buffer"""
+    offset = FILE_HEADER.size
+    while offset + CHUNK_HEADER.size <= size:
+        magic, count = CHUNK_HEADER.unpack_from(buf, offset)
+        data_offset = offset + CHUNK_HEADER.size
+        end = data_offset + 16 * count
+        if magic != CHUNK_MAGIC or end > size:
+            break
+        yield data_offset, count
+        offset = end
+
+
+def _write_chunk(f, times, pressures):
+    times = np.ascontiguousarray(times, dtype="<f8")
+    pressures = np.ascontiguousarray(pressures, dtype="<f8")
+    if len(times) != len(pressures):
+        raise ValueError("times and pressures must have the same length")
+    if len(times) == 0:
+        return
+    f.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(times)))
+    f.write(times.tobytes())
+    f.write(pressures.tobytes())
+
+
+def _check_header(buf):
+    magic, version, _, _ = FILE_HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a SPCe binary pressure log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary log version {version}")
+
+
+class BinaryLogWriter:
+    """Appends (time, pressure) chunks to a binary pressure log"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, "a+b")
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        if size == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, VERSION, FILE_HEADER.size, 0))
+            self._file.flush()
+            return
+
+        # Odřízni nedokončený chunk po případném pádu
+        mm = np.memmap(filename, dtype=np.uint8, mode="r")
+        _check_header(mm)
+        end = FILE_HEADER.size
+        for data_offset, count in _scan_chunks(mm, size):
+            end = data_offset + 16 * count
+        del mm
+        if end < size:
+            self._file.truncate(end)
+
+    def write_chunk(self, times, pressures):
+        _write_chunk(self._file, times, pressures)
+
+    def flush(self):
+        self._file.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class BinaryLogReader:
+    """Memory-maps a binary pressure log; slices are views into the file where possible"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.refresh()
+
+    def refresh(self):
+        """Map the file again to pick up chunks appended since the last call"""
+        self._times = []
+        self._pressures = []
+        # Prázdný soubor (writer ještě nezapsal hlavičku) nejde namapovat, je to log bez řádků
+        if os.path.getsize(self.filename) < FILE_HEADER.size:
+            self._mm = None
+            self._chunk_first = np.empty(0)
+            self._chunk_last = np.empty(0)
+            return
+        self._mm = np.memmap(self.filename, dtype=np.uint8, mode="r")
+        _check_header(self._mm)
+        for data_offset, count in _scan_chunks(self._mm, len(self._mm)):
+            self._times.append(self._mm[data_offset:data_offset + 8 * count].view("<f8"))
+            self._pressures.append(self._mm[data_offset + 8 * count:data_offset + 16 * count].view("<f8"))
+        self._chunk_first = np.array([t[0] for t in self._times], dtype=np.float64)
+        self._chunk_last = np.array([t[-1] for t in self._times], dtype=np.float64)
+
+    def __len__(self):
+        return sum(len(t) for t in self._times)
+
+    def time_range(self):
+        if not self._times:
+            return None
+        return float(self._chunk_first[0]), float(self._chunk_last[-1])
+
+    def read(self):
+        """Return all (times, pressures)"""
+        return self.slice()
+
+    def slice(self, start=None, end=None):
+        """Return (times, pressures) with start <= time <= end.
+
+        Only chunks overlapping the range are touched. A range inside one
+        chunk is returned as a zero-copy view of the mapped file.
+        """
+        if not self._times:
+            return np.empty(0), np.empty(0)
+        lo = 0 if start is None else int(np.searchsorted(self._chunk_last, start, side="left"))
+        hi = len(self._times) if end is None else int(np.searchsorted(self._chunk_first, end, side="right"))
+
+        times = []
+        pressures = []
+        for i in range(lo, hi):
+            t = self._times[i]
+            a = 0 if start is None else int(np.searchsorted(t, start, side="left"))
+            b = len(t) if end is None else int(np.searchsorted(t, end, side="right"))
+            if a < b:
+                times.append(t[a:b])
+                pressures.append(self._pressures[i][a:b])
+
+        if not times:
+            return np.empty(0), np.empty(0)
+        if len(times) == 1:
+            return times[0], pressures[0]
+        return np.concatenate(times), np.concatenate(pressures)
+
+
+def csv_to_binary(csv_path: str, bin_path: str = None):
+    """Convert a pressure CSV log to the binary format, returns (rows, bad_rows).
+
+    An existing `bin_path` is replaced, not appended to.
+    """
+    if bin_path is None:
+        bin_path = os.path.splitext(csv_path)[0] + ".bin"
+    rows = 0
+    bad_rows = 0
+    # Nový soubor místo připisování - opakovaný převod nesmí přidat druhou kopii dat
+    with atomic_write(bin_path) as f:
+        f.write(FILE_HEADER.pack(MAGIC, VERSION, FILE_HEADER.size, 0))
+        # Jeden chunk binárního souboru na každý blok CSV
+        for times, pressures, bad, _ in iter_csv(csv_path):
+            _write_chunk(f, times, pressures)
+            rows += len(times)
+            bad_rows += bad
+    return rows, bad_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pressure CSV logs to the binary format")
+    parser.add_argument("csv_files", nargs="+")
+    parser.add_argument("-o", "--output", help="output file (only with a single input)")
+    args = parser.parse_args()
+    if args.output and len(args.csv_files) > 1:
+        parser.error("--output can only be used with one input file")
+
+    for csv_path in args.csv_files:
+        rows, bad_rows = csv_to_binary(csv_path, args.output)
+        print(f"{csv_path}: {rows} rows converted, {bad_rows} invalid rows skipped")
+
+
+if __name__ == "__main__":
+    main()
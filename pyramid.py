@@ -0,0 +1,157 @@
+import numpy as np
+
+from pressure_io import GrowableArray, atomic_write
+
+
+FIELDS = ("t", "lo", "hi", "mean")
+
+
+def sidecar_path(log_path: str, x: str = "time") -> str:
+    """Pyramid file stored beside the log.
+
+    `x` is what the pyramid's x values are: "time" (epoch seconds) or
+    "index" (sample number). Each kind has its own file, so viewers with a
+    different x axis do not overwrite each other's pyramid.
+    """
+    if x == "time":
+        return log_path + ".pyr.npz"
+    return log_path + f".{x}.pyr.npz"
+
+
+class PressurePyramid:
+    """Min/max/mean decimation pyramid over a time series.
+
+    Level k holds one bucket per 2**k raw samples with the mean time, the
+    minimum, maximum and mean pressure. Levels are extended incrementally:
+    samples that do not fill a whole bucket yet wait in `_pending` (at most
+    one item per level). Level 0 is the raw data, which the caller keeps.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last_time = None
+        self.last_value = None
+        self.levels = [None]
+        self._pending = []
+
+    def _empty(self):
+        return tuple(np.empty(0) for _ in FIELDS)
+
+    def extend(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) == 0:
+            return
+        self.count += len(x)
+        self.last_time = float(x[-1])
+        self.last_value = float(y[-1])
+
+        src = (x, y, y, y)
+        k = 0
+        while True:
+            if k == len(self._pending):
+                self._pending.append(self._empty())
+            t, lo, hi, mean = (np.concatenate([p, s]) for p, s in zip(self._pending[k], src))
+            n = len(t) // 2 * 2
+            self._pending[k] = (t[n:], lo[n:], hi[n:], mean[n:])
+            if n == 0:
+                break
+
+            # Spoj dvojice položek úrovně k do úrovně k + 1
+            src = (
+                (t[0:n:2] + t[1:n:2]) / 2,
+                np.minimum(lo[0:n:2], lo[1:n:2]),
+                np.maximum(hi[0:n:2], hi[1:n:2]),
+                (mean[0:n:2] + mean[1:n:2]) / 2,
+            )
+            k += 1
+            if k == len(self.levels):
+                self.levels.append({name: GrowableArray() for name in FIELDS})
+            for name, values in zip(FIELDS, src):
+                self.levels[k][name].extend(values)
+
+    def sync(self, x, y):
+        """Add the samples of x/y not yet in the pyramid, rebuild if they do not match"""
+        if self.count > len(x) or (self.count and (x[self.count - 1] != self.last_time
+                                                   or y[self.count - 1] != self.last_value)):
+            self.__init__()
+        if self.count < len(x):
+            self.extend(x[self.count:], y[self.count:])
+
+    def level_for(self, n_visible: int, width: int) -> int:
+        """Lowest level that draws at most about `width` buckets"""
+        if width <= 0 or n_visible <= width:
+            return 0
+        k = int(np.ceil(np.log2(n_visible / width)))
+        return min(k, len(self.levels) - 1)
+
+    def view(self, x, y, x0: float, x1: float, width: int):
+        """Return (xs, ys, level) to draw the range x0..x1 on `width` pixels.
+
+        Decimated levels are drawn as a min/max envelope (two points per
+        bucket), so the number of points depends on the width only.
+        """
+        a = max(int(np.searchsorted(x, x0, side="left")) - 1, 0)
+        b = min(int(np.searchsorted(x, x1, side="right")) + 1, len(x))
+        k = self.level_for(b - a, width)
+        if k == 0:
+            return x[a:b], y[a:b], 0
+
+        level = self.levels[k]
+        t = level["t"].data
+        a = max(int(np.searchsorted(t, x0, side="left")) - 1, 0)
+        b = min(int(np.searchsorted(t, x1, side="right")) + 1, len(t))
+        parts = [(t[a:b], level["lo"].data[a:b], level["hi"].data[a:b])]
+
+        # Nejnovější vzorky, které ještě nezaplnily bucket úrovně k
+        for j in range(k - 1, -1, -1):
+            pt, plo, phi, _ = self._pending[j]
+            if len(pt) and x0 <= pt[0] <= x1:
+                parts.append((pt, plo, phi))
+
+        t = np.concatenate([p[0] for p in parts])
+        xs = np.repeat(t, 2)
+        ys = np.empty(len(xs))
+        ys[0::2] = np.concatenate([p[1] for p in parts])
+        ys[1::2] = np.concatenate([p[2] for p in parts])
+        return xs, ys, k
+
+    def save(self, path: str):
+        arrays = {"count": np.array(self.count),
+                  "last_time": np.array(np.nan if self.last_time is None else self.last_time),
+                  "last_value": np.array(np.nan if self.last_value is None else self.last_value)}
+        for k, level in enumerate(self.levels[1:], start=1):
+            for name in FIELDS:
+                arrays[f"l{k}_{name}"] = level[name].data
+        for k, pending in enumerate(self._pending):
+            for name, values in zip(FIELDS, pending):
+                arrays[f"p{k}_{name}"] = values
+
+        with atomic_write(path) as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str):
+        """Load a saved pyramid, returns None when the file is missing or unreadable"""
+        try:
+            with np.load(path) as npz:
+                pyramid = cls()
+                pyramid.count = int(npz["count"])
+                last_time = float(npz["last_time"])
+                pyramid.last_time = None if np.isnan(last_time) else last_time
+                last_value = float(npz["last_value"])
+                pyramid.last_value = None if np.isnan(last_value) else last_value
+                k = 1
+                while f"l{k}_t" in npz:
+                    level = {name: GrowableArray() for name in FIELDS}
+                    for name in FIELDS:
+                        level[name].extend(npz[f"l{k}_{name}"])
+                    pyramid.levels.append(level)
+                    k += 1
+                k = 0
+                while f"p{k}_t" in npz:
+                    pyramid._pending.append(tuple(npz[f"p{k}_{name}"] for name in FIELDS))
+                    k += 1
+                return pyramid
+        except (OSError, KeyError, ValueError):
+            return None
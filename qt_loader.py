@@ -0,0 +1,65 @@
+"""Background loading for the PyQt viewers.
+
+LoadTask runs a loading function on QThreadPool.globalInstance(), so the
+GUI thread keeps processing events while large logs are parsed. Results
+come back through Qt signals, which are delivered in the GUI thread.
+"""
+import threading
+
+from pyqtgraph.Qt import QtCore
+
+from pressure_io import LoadCancelled
+
+
+class LoadSignals(QtCore.QObject):
+    # done, total (bytes); object, because multi-GB sizes do not fit an int
+    progress = QtCore.Signal(object, object)
+    finished = QtCore.Signal(object)
+    failed = QtCore.Signal(object)
+    cancelled = QtCore.Signal()
+
+
+class LoadTask(QtCore.QRunnable):
+    """Calls func(*args, progress=..., cancelled=...) in a pool thread.
+
+    `func` reports progress with progress(done, total) and should stop
+    (return or raise LoadCancelled) once cancelled() returns True. Its
+    return value is emitted by `signals.finished`, an exception by
+    `signals.failed`.
+    """
+
+    def __init__(self, func, *args):
+        super().__init__()
+        self.func = func
+        self.args = args
+        # Signály musí vzniknout v GUI vlákně, aby se doručovaly do něj
+        self.signals = LoadSignals()
+        self._cancel = threading.Event()
+        self.done = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def start(self, pool: QtCore.QThreadPool = None):
+        (pool or QtCore.QThreadPool.globalInstance()).start(self)
+        return self
+
+    def run(self):
+        try:
+            result = self.func(*self.args, progress=self.signals.progress.emit,
+                               cancelled=self._cancel.is_set)
+        except LoadCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            if self._cancel.is_set():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+        finally:
+            self.done.set()
@@ -0,0 +1,108 @@
+import time
+
+from metrics import counter
+from pressure_stats import RollingWindow
+
+
+OVERRUNS = counter("sampling_overruns_total", "Samples that finished after the next deadline", ["scheduler"])
+MISSED = counter("sampling_missed_deadlines_total", "Deadlines skipped because of an overrun", ["scheduler"])
+
+
+class DeadlineScheduler:
+    """Fixed-rate sampling driven by time.monotonic deadlines.
+
+    Deadline k is start + k * period, so the rate does not drift by the time
+    the sample itself takes. When a sample runs past the next deadline it is
+    counted as an overrun and the next sample starts at once; deadlines that
+    passed completely are counted as missed and skipped, not made up in a
+    burst.
+    """
+
+    def __init__(self, rate: float, name: str = "default"):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.name = name
+        self.period = 1.0 / rate
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.max_late = 0.0
+        self._next = None
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next sample (for asyncio.sleep)"""
+        now = time.monotonic()
+        if self._next is None:
+            self._next = now
+        late = now - self._next
+        if late > 0 and self.ticks:
+            self.overruns += 1
+            OVERRUNS.inc(scheduler=self.name)
+            self.max_late = max(self.max_late, late)
+            skipped = int(late // self.period)
+            if skipped:
+                self.missed += skipped
+                MISSED.inc(skipped, scheduler=self.name)
+                self._next += skipped * self.period
+        delay = max(0.0, self._next - now)
+        self.ticks += 1
+        self._next += self.period
+        return delay
+
+    def set_rate(self, rate: float):
+        """Change the rate; the already scheduled deadline is kept, the following ones use the new period"""
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.period = 1.0 / rate
+
+    def wait(self):
+        """Sleep until the next deadline"""
+        time.sleep(self.next_delay())
+
+    def __str__(self):
+        return (f"{self.ticks} samples at {self.rate:g} Hz, {self.overruns} overruns, "
+                f"{self.missed} missed deadlines, max late {self.max_late * 1000:.1f} ms")
+
+
+class AdaptiveRate:
+    """Sampling rate that rises during fast pressure changes.
+
+    The relative rate of change |dP/dt| / P is the least-squares slope over
+    the last `window` seconds, so reading noise does not count as a
+    change. While it stays below `calm` (1/s) the rate is `min_rate`;
+    faster changes (pump-down, venting) raise it proportionally up to
+    `max_rate`. After a transient the rate stays up for `hold` seconds
+    before it falls back.
+    """
+
+    def __init__(self, min_rate: float, max_rate: float, calm: float = 0.005, hold: float = 30.0,
+                 window: float = 20.0):
+        if not 0 < min_rate <= max_rate:
+            raise ValueError(f"need 0 < min_rate <= max_rate, got {min_rate}, {max_rate}")
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.calm = calm
+        self.hold = hold
+        self.rate = min_rate
+        self.change = 0.0
+        self._trend = RollingWindow(window)
+        self._fast_until = 0.0
+
+    def update(self, t: float, p: float) -> float:
+        """Feed one sample, returns the rate for the next ones"""
+        self._trend.add(t, p)
+        slope = self._trend.dpdt
+        mean = self._trend.mean
+        if slope is None or not mean:
+            return self.rate
+        self.change = abs(slope / mean)
+
+        target = min(self.max_rate, max(self.min_rate, self.min_rate * self.change / self.calm))
+        if target >= self.rate:
+            self.rate = target
+            self._fast_until = t + self.hold
+        elif t >= self._fast_until:
+            self.rate = target
+        return self.rate
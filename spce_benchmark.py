@@ -0,0 +1,240 @@
+"""Acquisition and parsing benchmarks on top of the simulated SPCe.
+
+    python spce_benchmark.py                      # all benchmarks
+    python spce_benchmark.py --only parse --sizes 10000,1000000
+    python spce_benchmark.py --only deadband      # also checks the error bound
+    python spce_benchmark.py --only shared-port   # late replies on a shared RS-485 port
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from deadband import MODES, DeadbandFilter, reconstruction_error
+from pressure_bus import BusPublisher, BusSubscriber
+from pressure_io import CsvTailReader, format_timestamp, read_csv
+from pressure_logger import CsvLogger
+from pressure_store import BinaryLogReader, csv_to_binary
+from spce_controller import SPCe, SPCeError
+from spce_simulator import LeakModel, PtySimulator, SimulatedController, SimulatedSerial
+
+
+def report(name: str, value: float, unit: str):
+    print(f"{name:<45} {value:>14,.1f} {unit}")
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000.0
+    return np.percentile(values, 50), np.percentile(values, 95), values.max()
+
+
+def bench_acquisition(duration: float, latency: float):
+    """Samples per second through the SPCe protocol layer"""
+    print(f"\n# Acquisition ({latency * 1000:.1f} ms simulated reply latency)")
+    spce = SPCe("sim", ser=SimulatedSerial(SimulatedController(latency=latency)))
+
+    def rate(func):
+        n = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            func()
+            n += 1
+        return n / (time.perf_counter() - start)
+
+    report("get_pressure, in-process serial", rate(spce.get_pressure), "samples/s")
+    report("get_readings (3 commands batched)", rate(spce.get_readings), "batches/s")
+
+    if os.name == "posix":
+        sim = PtySimulator(SimulatedController(latency=latency)).start()
+        pty_spce = SPCe(sim.port)
+        try:
+            report("get_pressure, pseudo-terminal", rate(pty_spce.get_pressure), "samples/s")
+        finally:
+            pty_spce.close()
+            sim.close()
+
+
+def bench_latency(samples: int, interval: float):
+    """Time from a finished serial read until a viewer sees the sample"""
+    print(f"\n# End-to-end latency ({samples} samples every {interval * 1000:.0f} ms)")
+    spce = SPCe("sim", ser=SimulatedSerial(SimulatedController(latency=0.001)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "latency.csv")
+        sock_path = os.path.join(tmp, "bench.sock") if os.name == "posix" else ("127.0.0.1", 5099)
+        publisher = BusPublisher(sock_path)
+        subscriber = BusSubscriber(sock_path, retry_interval=0)
+        while not subscriber.connected:
+            subscriber.poll()
+        time.sleep(0.05)
+
+        logger = CsvLogger(csv_path, flush_rows=1)
+        acquired = []
+
+        def collect():
+            for _ in range(samples):
+                spce.get_pressure()
+                now = time.time()
+                acquired.append(time.perf_counter())
+                publisher.publish(now, 0.0)
+                logger.write({"pressure": 0.0, "time": format_timestamp(now)})
+                time.sleep(interval)
+
+        collector = threading.Thread(target=collect)
+        collector.start()
+
+        # Prohlížeč: CSV tail a socket, oba dotazované každou 1 ms
+        reader = CsvTailReader(csv_path)
+        csv_seen = []
+        bus_seen = []
+        deadline = None
+        while len(csv_seen) < samples or len(bus_seen) < samples:
+            if os.path.exists(csv_path):
+                times, _, _ = reader.read_new()
+                csv_seen.extend([time.perf_counter()] * len(times))
+            times, _ = subscriber.poll()
+            bus_seen.extend([time.perf_counter()] * len(times))
+            if not collector.is_alive():
+                deadline = deadline or time.perf_counter() + 2.0
+                if time.perf_counter() > deadline:
+                    break
+            time.sleep(0.001)
+
+        collector.join()
+        logger.close()
+        publisher.close()
+        subscriber.close()
+
+    n = min(len(acquired), len(csv_seen), len(bus_seen))
+    acquired = np.array(acquired[:n])
+    for name, seen in (("serial -> CSV -> tail reader", csv_seen), ("serial -> socket -> subscriber", bus_seen)):
+        p50, p95, worst = percentiles(np.array(seen[:n]) - acquired)
+        print(f"{name:<45} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  max {worst:8.2f} ms")
+
+
+def write_synthetic_csv(path: str, rows: int, chunk: int = 500000):
+    start = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    rng = np.random.default_rng(0)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write("pressure,time\r\n")
+        for first in range(0, rows, chunk):
+            n = min(chunk, rows - first)
+            t = start + (first + np.arange(n)) // 2
+            p = 3.4e-5 * (1 + 0.05 * rng.standard_normal(n))
+            stamps = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s)) for s in t]
+            f.write("".join(f"{v:.1E} ,{s}\r\n" for v, s in zip(p, stamps)))
+
+
+def bench_parse(sizes):
+    """CSV, binary and JSON throughput for growing log sizes"""
+    print("\n# Parse / serialize throughput")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            csv_path = os.path.join(tmp, f"bench_{rows}.csv")
+            write_synthetic_csv(csv_path, rows)
+            size_mb = os.path.getsize(csv_path) / 1e6
+
+            start = time.perf_counter()
+            times, values, bad = read_csv(csv_path)
+            elapsed = time.perf_counter() - start
+            report(f"CSV parse, {rows:,} rows ({size_mb:.0f} MB)", len(times) / elapsed, "rows/s")
+
+            bin_path = os.path.join(tmp, f"bench_{rows}.bin")
+            csv_to_binary(csv_path, bin_path)
+            start = time.perf_counter()
+            t, p = BinaryLogReader(bin_path).read()
+            float(p.sum())
+            elapsed = time.perf_counter() - start
+            report(f"binary memmap read, {rows:,} rows", len(t) / elapsed, "rows/s")
+
+            start = time.perf_counter()
+            json.dumps({"times": times.tolist(), "values": values.tolist()})
+            elapsed = time.perf_counter() - start
+            report(f"JSON encode, {rows:,} rows", len(times) / elapsed, "rows/s")
+
+
+def bench_shared_port(latency: float):
+    """Two addresses on one port: a late reply to one must not shift the replies of the other"""
+    print(f"\n# Shared port ({latency * 1000:.1f} ms simulated reply latency)")
+    models = {0x01: LeakModel(base=1e-5, start=1e-5, noise=0.0), 0x02: LeakModel(base=2e-5, start=2e-5, noise=0.0)}
+    ser = SimulatedSerial(SimulatedController(models, latency=latency))
+    a = SPCe("sim", addr=0x01, ser=ser)
+    b = SPCe("sim", addr=0x02, ser=ser)
+
+    # Dotaz na A vyprší, jeho odpověď přijde až během dotazu na B
+    ser.timeout = latency / 4
+    try:
+        a.get_pressure()
+    except SPCeError:
+        pass
+    ser.timeout = 10 * latency
+
+    rejected = 0
+    readings = []
+    for i in range(6):
+        if i == 3:
+            models[0x02].base = models[0x02].start = 9e-5
+        try:
+            readings.append((b.get_pressure(), models[0x02].base))
+        except SPCeError:
+            rejected += 1
+        time.sleep(2 * latency)
+    stale = sum(value != expected for value, expected in readings)
+    print(f"{'B after a timeout of A':<45} {len(readings)} readings, {rejected} rejected, {stale} stale")
+    assert stale == 0, f"B returned stale replies: {readings}"
+
+
+def bench_deadband(tolerance: float):
+    """Compression ratio of the log filter; fails when a rebuilt sample is off by more than the tolerance"""
+    print(f"\n# Deadband compression (tolerance {tolerance:g}, 0.5 s samples)")
+    rng = np.random.default_rng(0)
+    t = np.arange(7200) * 0.5
+    signals = {
+        "pump-down": 3e-5 + 1e-2 * np.exp(-t / 60),
+        "noisy flat": 3.4e-5 * (1 + 0.02 * rng.standard_normal(len(t))),
+        # Regulátor posílá dvě platné číslice
+        "flat, 2 digits": np.array([float(f"{v:.1E}") for v in 3.4e-5 * (1 + 0.02 * rng.standard_normal(len(t)))]),
+    }
+    for mode in MODES:
+        for name, p in signals.items():
+            deadband = DeadbandFilter(tolerance, max_gap=60.0, mode=mode)
+            stored = []
+            start = time.perf_counter()
+            for ti, pi in zip(t, p):
+                stored.extend(deadband.offer({"epoch": ti, "pressure": pi}))
+            stored.extend(deadband.flush())
+            elapsed = time.perf_counter() - start
+            error = reconstruction_error(t, p, [r["epoch"] for r in stored], [r["pressure"] for r in stored], mode)
+            print(f"{mode + ', ' + name:<32} {len(t) / len(stored):8.1f}:1  max error {error * 100:.3f} %"
+                  f"  {elapsed / len(t) * 1e6:.1f} us/sample")
+            assert error <= tolerance * (1 + 1e-9), f"{mode}, {name}: error {error:.4g} > {tolerance:g}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SPCe acquisition and parsing benchmarks")
+    parser.add_argument("--only", choices=["acquisition", "latency", "parse", "deadband", "shared-port"])
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per acquisition benchmark")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated reply latency in s")
+    parser.add_argument("--samples", type=int, default=200, help="samples for the latency benchmark")
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="row counts for parse benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="relative tolerance for the deadband check")
+    args = parser.parse_args()
+
+    if args.only in (None, "acquisition"):
+        bench_acquisition(args.duration, args.latency)
+    if args.only in (None, "latency"):
+        bench_latency(args.samples, 0.01)
+    if args.only in (None, "parse"):
+        bench_parse([int(s) for s in args.sizes.split(",")])
+    if args.only in (None, "shared-port"):
+        bench_shared_port(args.latency)
+    if args.only in (None, "deadband"):
+        bench_deadband(args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,245 @@
-import csv
-import os
 import time
+import weakref
+
 import serial
 
+from deadband import DeadbandFilter
+from metrics import counter, histogram, start_http_server
+from pressure_bus import BusPublisher, DEFAULT_ADDRESS
+from pressure_io import format_timestamp
+from pressure_logger import open_loggers
+from sampling import AdaptiveRate, DeadlineScheduler
+
+
+# Příkazy podle manuálu SPCe
+CMD_MODEL = 0x01
+CMD_CURRENT = 0x0A
+CMD_PRESSURE = 0x0B
+CMD_VOLTAGE = 0x0C
+
+
+COMMAND_SECONDS = histogram("spce_command_seconds", "Time from the write until the reply of a command",
+                            ["command"])
+TIMEOUTS = counter("spce_timeouts_total", "Commands without a complete reply", ["addr"])
+BAD_REPLIES = counter("spce_bad_replies_total", "Garbled or rejected replies", ["addr", "reason"])
+SAMPLE_SECONDS = histogram("spce_sample_seconds", "Whole acquisition loop iteration (read, log, publish)")
+
+
+class SPCeError(Exception):
+    """Invalid, garbled or negative reply from the controller"""
+
+
+class SPCeTimeout(SPCeError):
+    """No complete reply before the serial timeout"""
+
+
+def checksum(text: str) -> str:
+    """Sum of ASCII codes modulo 256 as two hex digits"""
+    return f"{sum(text.encode('ascii', errors='replace')) % 256:02X}"
+
+
+def parse_number(data: str) -> float:
+    """First field of a reply as a number, e.g. "3.4E-05 MBAR" -> 3.4e-05"""
+    try:
+        return float(data.split()[0])
+    except (IndexError, ValueError):
+        raise SPCeError(f"Unexpected value {data!r}") from None
+
+
+class PortState:
+    """Replies still expected on one serial port, shared by every SPCe using it"""
+
+    def __init__(self):
+        self.outstanding = 0
+
+
+_port_states = weakref.WeakKeyDictionary()
+
 
 class SPCe:
-    def __init__(self, port: str, addr: int = 0x05, baud: int = 9600):
+    def __init__(self, port: str, addr: int = 0x05, baud: int = 9600, ser=None):
         self.addr = addr
-        self.ser = serial.Serial(
-            port=port,
-            baudrate=baud,
-            timeout=0.5,
-            parity=serial.PARITY_NONE,
-            bytesize=serial.EIGHTBITS,
-            stopbits=serial.STOPBITS_ONE,
-        )
+        # Více regulátorů na jedné RS-485 sběrnici sdílí jeden port
+        if ser is None:
+            ser = serial.Serial(
+                port=port,
+                baudrate=baud,
+                timeout=0.5,
+                parity=serial.PARITY_NONE,
+                bytesize=serial.EIGHTBITS,
+                stopbits=serial.STOPBITS_ONE,
+            )
+        self.ser = ser
+        # Opožděná odpověď jednomu regulátoru leží ve vstupním bufferu všech na portu
+        self.port_state = _port_states.setdefault(ser, PortState())
 
     def _build_cmd(self, cmd: int, data: str = "00") -> bytes:
         return f"~ {self.addr:02X} {cmd:02X} {data}\r".encode("ascii")
 
+    def _drop_stale_replies(self):
+        # Zahoď opožděné odpovědi na dotazy, které vypršely (i jiného regulátoru na portu)
+        if self.port_state.outstanding:
+            self.ser.reset_input_buffer()
+            self.port_state.outstanding = 0
+
+    def _read_frame(self) -> str:
+        addr = f"{self.addr:02X}"
+        raw = self.ser.read_until(b"\r")
+        if not raw.endswith(b"\r"):
+            TIMEOUTS.inc(addr=addr)
+            raise SPCeTimeout(f"No reply from 0x{addr}")
+        frame = raw[:-1].decode("ascii", errors="replace").lstrip()
+        if checksum(frame[:-2]) == frame[-2:].upper() and not frame.startswith(addr + " "):
+            # Cizí (opožděná) odpověď - naše ještě může přijít, další dotaz buffer vyprázdní
+            self.ser.reset_input_buffer()
+            BAD_REPLIES.inc(addr=addr, reason="address")
+            raise SPCeError(f"Reply from address {frame[:2]}, expected {addr}: {frame!r}")
+        self.port_state.outstanding -= 1
+        return frame
+
+    def _parse_frame(self, frame: str) -> str:
+        # e.g.: "05 OK 00 DIGITEL SPCe 4C" - checksum covers everything before it
+        addr = f"{self.addr:02X}"
+        body, cs = frame[:-2], frame[-2:]
+        if len(frame) < 11 or checksum(body) != cs.upper():
+            BAD_REPLIES.inc(addr=addr, reason="checksum")
+            raise SPCeError(f"Bad checksum in reply {frame!r}")
+        # Adresu už ověřil _read_frame
+        parts = body.split(" ", 3)
+        if parts[1] != "OK":
+            BAD_REPLIES.inc(addr=addr, reason="controller")
+            raise SPCeError(f"Controller error {parts[2]}: {frame!r}")
+        return parts[3].strip() if len(parts) > 3 else ""
+
+    def transact(self, commands) -> list:
+        """Send several (cmd, data) commands in one write and return the reply data in order.
+
+        Replies carry no command code, so they are matched to requests by
+        order. All replies are read even if one is invalid, then the first
+        error is raised.
+        """
+        self._drop_stale_replies()
+        start = time.perf_counter()
+        self.ser.write(b"".join(self._build_cmd(cmd, data) for cmd, data in commands))
+        self.port_state.outstanding = len(commands)
+
+        results = []
+        error = None
+        for cmd, _ in commands:
+            frame = self._read_frame()
+            COMMAND_SECONDS.observe(time.perf_counter() - start, command=f"{cmd:02X}")
+            try:
+                results.append(self._parse_frame(frame))
+            except SPCeError as e:
+                error = error or e
+                results.append(None)
+        if error:
+            raise error
+        return results
+
+    def query(self, cmd: int, data: str = "00") -> str:
+        """Send one command and return the data part of a validated reply"""
+        return self.transact([(cmd, data)])[0]
+
     def send(self, cmd: int, data: str = "00") -> str:
+        """Send one command and return the raw reply line (no validation)"""
         packet = self._build_cmd(cmd, data)
-        self.ser.reset_input_buffer()
-        self.ser.write(packet)
-        resp = self.ser.read_until(b"\r").decode("ascii", errors="ignore").strip()
+        self._drop_stale_replies()
+        with COMMAND_SECONDS.time(command=f"{cmd:02X}"):
+            self.ser.write(packet)
+            resp = self.ser.read_until(b"\r").decode("ascii", errors="ignore").strip()
         return resp
 
     def get_model(self) -> str:
-        # command 0x01 = GET CONTROLLER MODEL
-        resp = self.send(0x01)
-        # e.g.: "05 OK 00 DIGITEL SPCe 4C"
-        parts = resp.split()
-        return " ".join(parts[3:-1]) if len(parts) >= 4 else resp
-
-    def get_pressure(self):
-        resp = self.send(0x0B)
-        pressure_resp = resp[9:17]
-        return pressure_resp
-
-    def save_to_csv(self, filename):
+        return self.query(CMD_MODEL)
+
+    def get_pressure(self) -> float:
+        return parse_number(self.query(CMD_PRESSURE))
+
+    def get_current(self) -> float:
+        return parse_number(self.query(CMD_CURRENT))
+
+    def get_voltage(self) -> float:
+        return parse_number(self.query(CMD_VOLTAGE))
+
+    def get_readings(self) -> dict:
+        """Pressure, current and voltage in one write-read cycle"""
+        pressure, current, voltage = self.transact(
+            [(CMD_PRESSURE, "00"), (CMD_CURRENT, "00"), (CMD_VOLTAGE, "00")])
+        return {
+            "pressure": parse_number(pressure),
+            "current": parse_number(current),
+            "voltage": parse_number(voltage),
+        }
+
+    def save_to_csv(self, filename, flush_rows: int = 10, flush_interval: float = 1.0,
+                    fsync: str = "flush", fmt: str = "csv", bus_address=None, rate: float = 2.0,
+                    metrics_port: int = None, rotate_bytes: int = None, rotate_age: float = None,
+                    compression: str = "gzip", alarms=None, deadband: DeadbandFilter = None,
+                    max_rate: float = None):
+        # fmt: "csv", "bin" (binární log vedle CSV, přípona .bin) nebo "both"
+        # alarms: AlarmEngine, vyhodnocuje se hned po přečtení každého vzorku
+        # deadband: do logu jen vzorky mimo toleranci (DeadbandFilter), prohlížeče dostanou všechny
+        # max_rate: při rychlé změně tlaku se vzorkuje až touto frekvencí (AdaptiveRate)
+        # rotate_bytes / rotate_age: CSV po segmentech (86400 = denně), uzavřené se komprimují
+        if metrics_port is not None:
+            # Metriky sběru pro Prometheus na http://127.0.0.1:<port>/metrics
+            start_http_server(metrics_port)
+        loggers = open_loggers(filename, fmt, rotate_bytes=rotate_bytes, rotate_age=rotate_age,
+                               compression=compression, flush_rows=flush_rows,
+                               flush_interval=flush_interval, fsync=fsync)
+        # Vzorky zároveň publikuj prohlížečům přes lokální socket
+        publisher = BusPublisher(bus_address) if bus_address is not None else None
+        scheduler = DeadlineScheduler(rate, name="save_to_csv")
+        adaptive = AdaptiveRate(rate, max_rate) if max_rate and max_rate > rate else None
         try:
             while True:
-                file_exists = os.path.exists(filename)
-                pressure = self.get_pressure()
-                fields = ["pressure", "time"]
+                scheduler.wait()
+                started = time.perf_counter()
+                before = time.time()
+                try:
+                    pressure = self.get_pressure()
+                except SPCeError as e:
+                    print("Error:", e)
+                    continue
+                # Čas vzorku: střed dotazu na regulátor
+                now = (before + time.time()) / 2
+                if alarms is not None:
+                    alarms.check(self.addr, now, pressure)
+                if adaptive is not None:
+                    scheduler.set_rate(adaptive.update(now, pressure))
 
                 record = {
                     "pressure": pressure,
-                    "time": time.strftime("%Y-%m-%d %H:%M:%S")
+                    "time": format_timestamp(now),
+                    "epoch": now,
                 }
 
-                with open(filename, "a", newline="", encoding="utf-8") as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fields)
-                    if not file_exists or os.path.getsize(filename) == 0:
-                        writer.writeheader()
-                    writer.writerow(record)
-                time.sleep(0.5)
+                if publisher is not None:
+                    publisher.publish(now, pressure, self.addr)
+                for stored in deadband.offer(record) if deadband is not None else [record]:
+                    for logger in loggers:
+                        logger.write(stored)
+                SAMPLE_SECONDS.observe(time.perf_counter() - started)
 
         except KeyboardInterrupt:
             print("User stopped script")
         except Exception as e:
             print("Error:", e)
+        finally:
+            # Zapiš zbývající řádky z bufferu (i poslední vzorek, který filtr zatím držel)
+            for stored in deadband.flush() if deadband is not None else []:
+                for logger in loggers:
+                    logger.write(stored)
+            for logger in loggers:
+                logger.close()
+            if publisher is not None:
+                publisher.close()
+            if alarms is not None:
+                alarms.close()
+            print(scheduler)
+            if deadband is not None:
+                print(deadband)
 
     def close(self):
         self.ser.close()
@@ -70,5 +249,5 @@ if __name__ == "__main__":
     print("RAW:", spce.send(0x01))
     print("Model:", spce.get_model())
     print("Pressure:", spce.get_pressure())
-    spce.save_to_csv(filename="spce_pressure.csv")
+    spce.save_to_csv(filename="spce_pressure.csv", bus_address=DEFAULT_ADDRESS)
     spce.close()
\ No newline at end of file
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+
+from alarms import AlarmEngine
+from deadband import DeadbandFilter, add_deadband_arguments, deadband_args
+from metrics import start_http_server
+from pressure_bus import BusPublisher, DEFAULT_ADDRESS
+from pressure_io import format_timestamp
+from pressure_logger import add_rotation_arguments, open_csv_logger, rotation_args
+from sampling import AdaptiveRate, DeadlineScheduler
+from spce_controller import SPCe, SPCeError, SPCeTimeout
+
+
+class Device:
+    """One SPCe controller: serial port, bus address and its polling settings"""
+
+    def __init__(self, port: str, addr: int = 0x05, rate: float = 2.0, timeout: float = 0.5,
+                 max_rate: float = None):
+        self.port = port
+        self.addr = addr
+        self.rate = rate
+        self.timeout = timeout
+        self.samples = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.scheduler = DeadlineScheduler(rate, name=f"{port}:{addr:02X}")
+        # Při rychlé změně tlaku se vzorkuje častěji (až max_rate)
+        self.adaptive = AdaptiveRate(rate, max_rate) if max_rate and max_rate > rate else None
+
+    def __repr__(self):
+        return f"Device({self.port!r}, addr=0x{self.addr:02X}, rate={self.rate})"
+
+
+class PortWorker:
+    """Serializes requests on one serial port.
+
+    Every port gets its own single-thread executor, so blocking pyserial calls
+    for different ports run in parallel while controllers sharing one RS-485
+    bus are queried strictly one after another.
+    """
+
+    def __init__(self, port: str, baud: int = 9600):
+        self.port = port
+        self.ser = serial.Serial(
+            port=port,
+            baudrate=baud,
+            timeout=0.5,
+            parity=serial.PARITY_NONE,
+            bytesize=serial.EIGHTBITS,
+            stopbits=serial.STOPBITS_ONE,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"spce-{port}")
+        self._controllers = {}
+
+    def controller(self, addr: int) -> SPCe:
+        if addr not in self._controllers:
+            self._controllers[addr] = SPCe(self.port, addr=addr, ser=self.ser)
+        return self._controllers[addr]
+
+    def _get_pressure(self, addr: int, timeout: float):
+        self.ser.timeout = timeout
+        return self.controller(addr).get_pressure()
+
+    async def get_pressure(self, addr: int, timeout: float):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._get_pressure, addr, timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.ser.close()
+
+
+class SPCePoller:
+    """Polls pressure (0x0B) from many SPCe controllers concurrently.
+
+    Samples from all devices are merged into one queue of
+    (timestamp, port, addr, pressure) tuples.
+    """
+
+    def __init__(self, devices, baud: int = 9600, queue_size: int = 10000, alarms=None):
+        self.devices = list(devices)
+        self.baud = baud
+        # AlarmEngine - vyhodnocuje se hned u zdroje, ne až u zápisu do CSV
+        self.alarms = alarms
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._workers = {}
+
+    def _worker(self, port: str) -> PortWorker:
+        if port not in self._workers:
+            self._workers[port] = PortWorker(port, baud=self.baud)
+        return self._workers[port]
+
+    def _publish(self, sample):
+        try:
+            self.queue.put_nowait(sample)
+        except asyncio.QueueFull:
+            # Pomalý konzument nesmí zastavit sběr dat
+            self.dropped += 1
+
+    async def _poll_device(self, device: Device):
+        worker = self._worker(device.port)
+        while True:
+            await asyncio.sleep(device.scheduler.next_delay())
+            before = time.time()
+            try:
+                pressure = await worker.get_pressure(device.addr, device.timeout)
+            except SPCeTimeout:
+                device.timeouts += 1
+            except (SPCeError, serial.SerialException, OSError) as e:
+                device.errors += 1
+                print(f"{device}: {e}")
+            else:
+                device.samples += 1
+                now = (before + time.time()) / 2
+                if self.alarms is not None:
+                    self.alarms.check(device.addr, now, pressure)
+                if device.adaptive is not None:
+                    device.scheduler.set_rate(device.adaptive.update(now, pressure))
+                self._publish((now, device.port, device.addr, pressure))
+
+    async def run(self):
+        """Poll all devices until cancelled"""
+        tasks = [asyncio.create_task(self._poll_device(d)) for d in self.devices]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.close()
+
+    async def samples(self):
+        while True:
+            yield await self.queue.get()
+
+    def close(self):
+        for worker in self._workers.values():
+            worker.close()
+        self._workers.clear()
+
+
+def parse_device(spec: str, rate: float, timeout: float, max_rate: float = None):
+    """Parse "PORT:ADDR[,ADDR...]" (addresses in hex) into Device objects"""
+    port, _, addrs = spec.rpartition(":")
+    if not port:
+        return [Device(spec, rate=rate, timeout=timeout, max_rate=max_rate)]
+    return [Device(port, addr=int(a, 16), rate=rate, timeout=timeout, max_rate=max_rate)
+            for a in addrs.split(",")]
+
+
+async def log_to_csv(poller: SPCePoller, filename: str, publisher: BusPublisher = None,
+                     deadband: dict = None, **rotation):
+    logger = open_csv_logger(filename, fields=["pressure", "time", "port", "addr"], **rotation)
+    # Každý regulátor má vlastní filtr (deadband = argumenty DeadbandFilter)
+    filters = {}
+    poll_task = asyncio.create_task(poller.run())
+    try:
+        async for t, port, addr, pressure in poller.samples():
+            if publisher is not None:
+                publisher.publish(t, pressure, addr)
+            record = {
+                "pressure": pressure,
+                "time": format_timestamp(t),
+                "port": port,
+                "addr": f"{addr:02X}",
+                "epoch": t,
+            }
+            if deadband is None:
+                logger.write(record)
+                continue
+            key = (port, addr)
+            if key not in filters:
+                filters[key] = DeadbandFilter(**deadband)
+            for stored in filters[key].offer(record):
+                logger.write(stored)
+    finally:
+        poll_task.cancel()
+        await asyncio.gather(poll_task, return_exceptions=True)
+        for (port, addr), deadband_filter in filters.items():
+            for stored in deadband_filter.flush():
+                logger.write(stored)
+            print(f"{port}:{addr:02X}: {deadband_filter}")
+        logger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll pressure from several SPCe controllers")
+    parser.add_argument("devices", nargs="+", help='e.g. "COM5:05" or "/dev/ttyUSB0:01,02,03"')
+    parser.add_argument("--rate", type=float, default=2.0, help="samples per second per device")
+    parser.add_argument("--timeout", type=float, default=0.5, help="reply timeout in seconds")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--out", default="spce_pressure.csv")
+    parser.add_argument("--bus", action="store_true", help="publish samples to local viewers (a viewer shows one controller)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    add_rotation_arguments(parser)
+    parser.add_argument("--alarms", help="JSON file with alarm rules per address, see alarms.py")
+    parser.add_argument("--max-rate", type=float, help="poll up to this rate during fast pressure changes")
+    add_deadband_arguments(parser)
+    args = parser.parse_args()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    devices = []
+    for spec in args.devices:
+        devices.extend(parse_device(spec, args.rate, args.timeout, args.max_rate))
+
+    alarms = AlarmEngine.from_config(args.alarms) if args.alarms else None
+    poller = SPCePoller(devices, baud=args.baud, alarms=alarms)
+    publisher = BusPublisher(DEFAULT_ADDRESS) if args.bus else None
+    try:
+        asyncio.run(log_to_csv(poller, args.out, publisher, deadband=deadband_args(args), **rotation_args(args)))
+    except KeyboardInterrupt:
+        print("User stopped script")
+    finally:
+        if publisher is not None:
+            publisher.close()
+        if alarms is not None:
+            alarms.close()
+    for d in devices:
+        print(f"{d}: samples={d.samples} timeouts={d.timeouts} errors={d.errors} "
+              f"overruns={d.scheduler.overruns} missed={d.scheduler.missed}")
+
+
+if __name__ == "__main__":
+    main()
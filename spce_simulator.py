@@ -0,0 +1,227 @@
+"""Simulated DIGITEL SPCe controller.
+
+Answers the "~ AA CC DD\\r" packets built by SPCe._build_cmd with checksummed
+replies like a real controller. It can be used in-process through
+SimulatedSerial (pass it as SPCe(..., ser=...)) or, on POSIX systems, over a
+pseudo-terminal that any serial program can open (PtySimulator).
+"""
+import argparse
+import math
+import os
+import random
+import threading
+import time
+
+from spce_controller import CMD_CURRENT, CMD_MODEL, CMD_PRESSURE, CMD_VOLTAGE, checksum
+
+
+class LeakModel:
+    """Pressure curve: exponential pump-down to base pressure plus a linear leak.
+
+    p(t) = base + (start - base) * exp(-t / tau) + leak_rate * t, with
+    relative gaussian noise.
+    """
+
+    def __init__(self, base: float = 3.0e-5, start: float = 1.0e-2, tau: float = 60.0,
+                 leak_rate: float = 0.0, noise: float = 0.02, seed=None):
+        self.base = base
+        self.start = start
+        self.tau = tau
+        self.leak_rate = leak_rate
+        self.noise = noise
+        self._random = random.Random(seed)
+        self._t0 = time.monotonic()
+
+    def pressure(self, t: float = None) -> float:
+        if t is None:
+            t = time.monotonic() - self._t0
+        p = self.base + (self.start - self.base) * math.exp(-t / self.tau) + self.leak_rate * t
+        return max(p * (1.0 + self._random.gauss(0.0, self.noise)), 1e-12)
+
+
+class SimulatedController:
+    """Protocol logic of one or more SPCe controllers on a shared bus"""
+
+    def __init__(self, models=None, latency: float = 0.02, model_name: str = "DIGITEL SPCe"):
+        # {adresa: LeakModel}
+        self.models = models if models is not None else {0x05: LeakModel()}
+        self.latency = latency
+        self.model_name = model_name
+        self.requests = 0
+
+    def _frame(self, addr: int, status: str, data: str) -> bytes:
+        body = f"{addr:02X} {status} {data} "
+        return (body + checksum(body) + "\r").encode("ascii")
+
+    def handle(self, packet: bytes):
+        """Reply to one packet (without the trailing CR), or None if it is not for us"""
+        parts = packet.decode("ascii", errors="replace").split()
+        if len(parts) < 3 or parts[0] != "~":
+            return None
+        try:
+            addr = int(parts[1], 16)
+            cmd = int(parts[2], 16)
+        except ValueError:
+            return None
+        model = self.models.get(addr)
+        if model is None:
+            # Jiná adresa na sběrnici - nikdo neodpoví
+            return None
+
+        self.requests += 1
+        if cmd == CMD_MODEL:
+            return self._frame(addr, "OK", f"00 {self.model_name}")
+        if cmd == CMD_PRESSURE:
+            return self._frame(addr, "OK", f"00 {model.pressure():.1E} PA")
+        if cmd == CMD_CURRENT:
+            # Proud iontové vývěvy zhruba úměrný tlaku
+            return self._frame(addr, "OK", f"00 {model.pressure() * 1e-2:.1E} AMPS")
+        if cmd == CMD_VOLTAGE:
+            return self._frame(addr, "OK", "00 7000")
+        return self._frame(addr, "ER", "01 UNKNOWN COMMAND")
+
+
+class SimulatedSerial:
+    """In-process stand-in for serial.Serial talking to a SimulatedController.
+
+    Replies become readable `latency` seconds after the request was written;
+    read_until honours `timeout` like pyserial does.
+    """
+
+    def __init__(self, controller: SimulatedController = None, timeout: float = 0.5):
+        self.controller = controller or SimulatedController()
+        self.timeout = timeout
+        self.is_open = True
+        self._incoming = b""
+        self._scheduled = []
+        self._buffer = bytearray()
+
+    def _collect_due(self):
+        now = time.monotonic()
+        while self._scheduled and self._scheduled[0][0] <= now:
+            self._buffer += self._scheduled.pop(0)[1]
+
+    @property
+    def in_waiting(self) -> int:
+        self._collect_due()
+        return len(self._buffer)
+
+    def write(self, data: bytes) -> int:
+        self._incoming += data
+        ready = time.monotonic()
+        while b"\r" in self._incoming:
+            packet, self._incoming = self._incoming.split(b"\r", 1)
+            reply = self.controller.handle(packet)
+            if reply is not None:
+                # Regulátor zpracovává příkazy jeden po druhém
+                ready = max(ready, self._scheduled[-1][0] if self._scheduled else ready)
+                ready += self.controller.latency
+                self._scheduled.append((ready, reply))
+        return len(data)
+
+    def read_until(self, expected: bytes = b"\n", size=None) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            self._collect_due()
+            end = self._buffer.find(expected)
+            if end >= 0:
+                data = bytes(self._buffer[:end + len(expected)])
+                del self._buffer[:end + len(expected)]
+                return data
+
+            now = time.monotonic()
+            wake = self._scheduled[0][0] if self._scheduled else None
+            if deadline is not None:
+                if now >= deadline:
+                    data = bytes(self._buffer)
+                    self._buffer.clear()
+                    return data
+                wake = deadline if wake is None else min(wake, deadline)
+            if wake is None:
+                # Bez timeoutu a bez odpovědi by se čekalo navždy
+                raise TimeoutError("No reply scheduled and no timeout set")
+            time.sleep(max(0.0, wake - now))
+
+    def reset_input_buffer(self):
+        self._collect_due()
+        self._buffer.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySimulator:
+    """Serves a SimulatedController on a pseudo-terminal (POSIX only).
+
+    Open `port` with pyserial (or SPCe(port)) like a real serial device.
+    """
+
+    def __init__(self, controller: SimulatedController = None):
+        import pty
+        import tty
+
+        self.controller = controller or SimulatedController()
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="spce-sim", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _serve(self):
+        import select
+
+        pending = b""
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                pending += os.read(self._master, 4096)
+            except OSError:
+                break
+            while b"\r" in pending:
+                packet, pending = pending.split(b"\r", 1)
+                reply = self.controller.handle(packet)
+                if reply is not None:
+                    time.sleep(self.controller.latency)
+                    os.write(self._master, reply)
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a simulated SPCe controller on a pseudo-terminal")
+    parser.add_argument("--addr", default="05", help="bus addresses in hex, e.g. 05 or 01,02,03")
+    parser.add_argument("--latency", type=float, default=0.02, help="reply latency in seconds")
+    parser.add_argument("--base", type=float, default=3.0e-5, help="base pressure")
+    parser.add_argument("--start", type=float, default=1.0e-2, help="pressure at start")
+    parser.add_argument("--tau", type=float, default=60.0, help="pump-down time constant in s")
+    parser.add_argument("--leak", type=float, default=0.0, help="leak rate in pressure units per s")
+    parser.add_argument("--noise", type=float, default=0.02, help="relative noise")
+    args = parser.parse_args()
+
+    models = {int(a, 16): LeakModel(args.base, args.start, args.tau, args.leak, args.noise)
+              for a in args.addr.split(",")}
+    sim = PtySimulator(SimulatedController(models, latency=args.latency)).start()
+    print(f"Simulated SPCe on {sim.port} (addresses {args.addr}), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("User stopped script")
+    finally:
+        sim.close()
+
+
+if __name__ == "__main__":
+    main()
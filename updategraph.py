@@ -1,21 +1,36 @@
-import csv
 import sys
+from datetime import datetime
 from PyQt5 import QtCore, QtWidgets
+import numpy as np
 import pyqtgraph as pg
 from PyQt5.QtCore import QProcess
 from PyQt5.QtWidgets import QLabel, QLineEdit
 
 import dynamic_data
+from pressure_bus import BusSubscriber
+from metrics import counter
+from pressure_io import CsvTailReader, RingBuffer
+
+# Kolik bodů popisků na ose X
+TICK_COUNT = 10
+
+VIEWER_ERRORS = counter("viewer_errors_total", "Exceptions while updating the plot", ["viewer"])
 
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, csv_file="pressure_test_data.csv"):
+    def __init__(self, csv_file="pressure_test_data.csv", window_hours=4.0, sample_rate=2.0):
         super().__init__()
 
         self.setWindowTitle("PyQtGraph Dynamic Graph")
         self.resize(800, 600)  # Set window size
         self.csv_file = csv_file
-        self.last_row_count = 0
+        self.reader = CsvTailReader(csv_file)
+        # Živá data z kolektoru přes lokální socket, CSV jen když kolektor neběží
+        # (a jednou na začátku kvůli historii)
+        self.bus = BusSubscriber()
+        self.backlog_loaded = False
+        # Live okno: posledních window_hours hodin při sample_rate vzorcích/s
+        self.window_size = int(window_hours * 3600 * sample_rate)
 
         # QProcess for running data collection script
         self.process = QProcess(self)
@@ -68,25 +83,26 @@ class MainWindow(QtWidgets.QMainWindow):
         self.plot_graph.showGrid(x=True, y=True)
         #self.plot_graph.setYRange(20, 40)
 
-        # Data storage - keeps ALL data
-        self.time = []
-        self.pressure = []
-        self.time_labels = []
+        # Data storage - ring buffers with the live window only
+        # time = pořadové číslo vzorku (osa X), timestamps = unix čas pro popisky
+        self.time = RingBuffer(self.window_size)
+        self.pressure = RingBuffer(self.window_size)
+        self.timestamps = RingBuffer(self.window_size)
+        self.sample_count = 0
 
         # Get a line reference
         self.line = self.plot_graph.plot(
-            self.time,
-            self.pressure,
             name="Pressure",
             pen=pg.mkPen(color='orange', width=2)
         )
+        self.plot_graph.sigXRangeChanged.connect(self.update_ticks)
 
         # Load initial data from CSV
         #self.load_csv_data()
 
         # Add a timer to check for new data in CSV
         self.timer = QtCore.QTimer()
-        self.timer.setInterval(500)  # Check every 500ms
+        self.timer.setInterval(100)  # Check every 100ms (bus), CSV is cheap to tail
         self.timer.timeout.connect(self.update_plot)
         self.timer.start()
 
@@ -97,10 +113,8 @@ class MainWindow(QtWidgets.QMainWindow):
             print(f"CSV file set to: {csv_file}")
 
             # Clear existing data
-            self.time = []
-            self.pressure = []
-            self.time_labels = []
-            self.last_row_count = 0
+            self.reader = CsvTailReader(csv_file)
+            self.clear_data()
 
             # Try to load the new file
             #self.load_csv_data()
@@ -119,61 +133,99 @@ class MainWindow(QtWidgets.QMainWindow):
             self.collect_button.setEnabled(True)
             self.stop_button.setEnabled(False)
 
+    def clear_data(self):
+        self.time.clear()
+        self.pressure.clear()
+        self.timestamps.clear()
+        self.sample_count = 0
+        self.backlog_loaded = False
+
+    def read_new_rows(self):
+        """Read samples from the bus, or rows appended to the CSV, into the ring buffers.
+
+        The CSV is read once at the start for the history, then only while
+        no collector publishes on the bus.
+        """
+        # Socket se připojí před čtením CSV, takže mezi historií a živými daty nic nechybí
+        bus_timestamps, bus_pressures = self.bus.poll()
+        n = 0
+        if not self.backlog_loaded or not self.bus.connected:
+            try:
+                timestamps, pressures, reset = self.reader.read_new()
+            except FileNotFoundError:
+                # Kolektor ještě CSV nezaložil
+                timestamps, pressures, reset = np.empty(0), np.empty(0), False
+            if reset:
+                self.clear_data()
+            self.backlog_loaded = True
+            if self.reader.bad_rows:
+                print(f"Skipped {self.reader.bad_rows} invalid rows")
+                self.reader.bad_rows = 0
+            n += self.add_samples(timestamps, pressures)
+        # Vzorky ze socketu, které už jsou v CSV, přeskoč
+        return n + self.add_samples(bus_timestamps, bus_pressures)
+
+    def add_samples(self, timestamps, pressures):
+        """Append the samples newer than the last one in the buffers"""
+        if len(self.timestamps) and len(timestamps):
+            newer = timestamps > self.timestamps.data[-1]
+            timestamps = timestamps[newer]
+            pressures = pressures[newer]
+        n = len(timestamps)
+        if n:
+            self.time.extend(np.arange(self.sample_count, self.sample_count + n, dtype=np.float64))
+            self.pressure.extend(pressures)
+            self.timestamps.extend(timestamps)
+            self.sample_count += n
+        return n
+
+    def update_ticks(self):
+        """Time labels only for the visible part of the window"""
+        if len(self.time) == 0:
+            return
+        x = self.time.data
+        x0, x1 = self.plot_graph.viewRange()[0]
+        lo = int(np.searchsorted(x, x0, side="left"))
+        hi = int(np.searchsorted(x, x1, side="right"))
+        if hi <= lo:
+            return
+        step = max(1, (hi - lo) // TICK_COUNT)
+        ticks = [(x[i], datetime.fromtimestamp(self.timestamps.data[i]).strftime("%Y-%m-%d %H:%M:%S"))
+                 for i in range(lo, hi, step)]
+
+        ax = self.plot_graph.getAxis('bottom')
+        ax.setTicks([ticks])
+
     def load_csv_data(self):
-        """Load all data from CSV file"""
+        """Load the live window from the CSV file"""
         try:
-            with open(self.csv_file, 'r') as f:
-                reader = csv.reader(f)
-                next(reader)
-                rows = list(reader)
-
-                if rows:
-                    # Read data assuming no header (just time, temperature columns)
-                    for row in rows:
-                        if len(row) >= 2:
-                            try:
-                                self.time.append(len(self.time))
-                                self.pressure.append(float(row[0]))
-                                self.time_labels.append(row[1])
-                            except ValueError:
-                                continue  # Skip rows with invalid data
-
-                    self.last_row_count = len(rows)
-
-                    if self.time and self.pressure:
-                        self.line.setData(self.time, self.pressure)
-                        # Auto-adjust x-axis range to show all data
-                        self.plot_graph.setXRange(min(self.time), max(self.time))
-                        # Set up custom x-axis labels with time strings
-                        # Show every nth label to avoid overcrowding
-                        step = max(1, len(self.time_labels) // 10)
-                        ticks = []
-                        for i in range(0, len(self.time_labels), step):
-                            ticks.append((i, self.time_labels[i]))
-
-                        ax = self.plot_graph.getAxis('bottom')
-                        ax.setTicks([ticks])
-
-                        # Disable auto SI prefix and format as scientific notation
-                        left_axis = self.plot_graph.getAxis('left')
-                        left_axis.enableAutoSIPrefix(False)
-
-                        # Override the tick string method to show scientific notation
-                        class ScientificAxis(pg.AxisItem):
-                            def tickStrings(self, values, scale, spacing):
-                                return [f'{val:.1e}' for val in values]
-
-                        # Replace the left axis
-                        self.plot_graph.setAxisItems({'left': ScientificAxis(orientation='left')})
-                        print(f"Loaded {len(self.time)} data points from CSV")
-
-                        # Set ranges
-                        self.plot_graph.setXRange(0, len(self.time) - 1)
-                        if self.pressure:
-                            min_pressure = min(self.pressure)
-                            max_pressure = max(self.pressure)
-                            margin = (max_pressure - min_pressure) * 0.1
-                            self.plot_graph.setYRange(min_pressure - margin, max_pressure + margin)
+            self.reader = CsvTailReader(self.csv_file)
+            self.clear_data()
+            self.read_new_rows()
+
+            if len(self.time):
+                self.line.setData(self.time.data, self.pressure.data)
+
+                # Disable auto SI prefix and format as scientific notation
+                left_axis = self.plot_graph.getAxis('left')
+                left_axis.enableAutoSIPrefix(False)
+
+                # Override the tick string method to show scientific notation
+                class ScientificAxis(pg.AxisItem):
+                    def tickStrings(self, values, scale, spacing):
+                        return [f'{val:.1e}' for val in values]
+
+                # Replace the left axis
+                self.plot_graph.setAxisItems({'left': ScientificAxis(orientation='left')})
+                print(f"Loaded {len(self.time)} data points from CSV")
+
+                # Set ranges
+                self.plot_graph.setXRange(self.time.data[0], self.time.data[-1])
+                min_pressure = float(self.pressure.data.min())
+                max_pressure = float(self.pressure.data.max())
+                margin = (max_pressure - min_pressure) * 0.1
+                self.plot_graph.setYRange(min_pressure - margin, max_pressure + margin)
+                self.update_ticks()
         except FileNotFoundError:
             print(f"CSV file '{self.csv_file}' not found")
         except Exception as e:
@@ -182,66 +234,24 @@ class MainWindow(QtWidgets.QMainWindow):
     def update_plot(self):
         """Check for new data in CSV and update plot"""
         try:
-            with open(self.csv_file, 'r') as f:
-                reader = csv.reader(f)
-                try:
-                    next(reader) # Skip header
-                except StopIteration:
-                    return # File is empty
-
-                rows = list(reader)
-
-                # Skip if no data rows
-                if not rows:
-                    return
-
-                current_row_count = len(rows)
-
-                # Only update if new rows were added
-                if current_row_count > self.last_row_count:
-                    # Get only the new rows
-                    new_rows = rows[self.last_row_count:]
-
-                    for row in new_rows:
-                        if len(row) >= 2:
-                            try:
-                                self.time.append(len(self.time))
-                                self.pressure.append(float(row[0]))
-                                self.time_labels.append(row[1])
-                            except ValueError:
-                                continue  # Skip rows with invalid data
-
-                    self.last_row_count = current_row_count
-
-                    # Update the plot with ALL data (old + new)
-                    self.line.setData(self.time, self.pressure)
-                    step = max(1, len(self.time_labels) // 10)
-                    ticks = []
-                    for i in range(0, len(self.time_labels), step):
-                        ticks.append((i, self.time_labels[i]))
-
-                    ax = self.plot_graph.getAxis('bottom')
-                    ax.setTicks([ticks])
-
-                    # Auto-adjust x-axis range to show all data
-                    #if self.time:
-                    #    self.plot_graph.setXRange(min(self.time), max(self.time))
-
-                    print(f"Updated plot: Total data points = {len(self.time)}")
-                    # Set ranges
-                    #self.plot_graph.setXRange(0, len(self.time) - 1)
-                    # if self.pressure:
-                    #     min_pressure = min(self.pressure)
-                    #     max_pressure = max(self.pressure)
-                    #     margin = (max_pressure - min_pressure) * 0.1
-                    #     self.plot_graph.setYRange(min_pressure - margin, max_pressure + margin)
+            # Čte jen řádky od uloženého offsetu
+            new_rows = self.read_new_rows()
+
+            # Only update if new rows were added
+            if new_rows:
+                # Update the plot with the live window
+                self.line.setData(self.time.data, self.pressure.data)
+                self.update_ticks()
+
+                #print(f"Updated plot: Total data points = {self.sample_count}, in window = {len(self.time)}")
 
         except FileNotFoundError:
             #print(f"CSV file '{self.csv_file}' not found")
             pass
         except Exception as e:
-            pass
-            #print(f"Error updating plot: {e}")
+            # Chyba se nepolyká - vypíše se a započítá
+            VIEWER_ERRORS.inc(viewer="updategraph")
+            print(f"Error updating plot: {e}")
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication([])
@@ -0,0 +1,56 @@
+"""Locally served JavaScript libraries for the web graph.
+
+The dashboard must load on lab networks without internet access, so the
+pinned libraries are kept in static/vendor/. Download them once on a
+connected machine:
+
+    python web_assets.py
+
+Files that are missing are still loaded from the CDN.
+"""
+import os
+import urllib.request
+
+from flask import url_for
+
+
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "vendor")
+
+# Pevné verze - stejné soubory lokálně i z CDN
+ASSETS = {
+    "chart": ("chart.umd.min.js",
+              "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"),
+    "zoom": ("chartjs-plugin-zoom.min.js",
+             "https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js"),
+}
+
+
+def asset_urls() -> dict:
+    """{name: url} preferring the local copy (call inside a Flask request)"""
+    urls = {}
+    for name, (filename, cdn_url) in ASSETS.items():
+        if os.path.exists(os.path.join(VENDOR_DIR, filename)):
+            urls[name] = url_for("static", filename=f"vendor/{filename}")
+        else:
+            urls[name] = cdn_url
+    return urls
+
+
+def download(force: bool = False):
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    for filename, url in ASSETS.values():
+        path = os.path.join(VENDOR_DIR, filename)
+        if os.path.exists(path) and not force:
+            print(f"{filename}: already present")
+            continue
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        print(f"{filename}: {len(data)} bytes from {url}")
+
+
+if __name__ == "__main__":
+    download()
@@ -1,31 +1,227 @@
-from flask import Flask, render_template, jsonify
-import csv
+import argparse
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Flask, Response, g, render_template, jsonify, make_response, request
+import numpy as np
+
+from downsample import downsample
+from data_cache import cache
+from log_index import open_series
+from metrics import CONTENT_TYPE, REGISTRY, histogram
+from pressure_bus import BusFeed
+from pressure_io import format_local_times, parse_local_times
+from web_assets import asset_urls
+from web_payload import MIMETYPE, compress_response, encode_points
 
 app = Flask(__name__)
+# Knihovny ve static/vendor mají pevnou verzi, prohlížeč je může držet den
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 24 * 3600
 
 filename = "pressure_test_data.csv"
 
+DEFAULT_MAX_POINTS = 2000
+
+REQUEST_SECONDS = histogram("web_request_seconds", "Handling one request including compression", ["endpoint", "status"])
+SERIALIZE_SECONDS = histogram("web_serialize_seconds", "Building the point payload", ["format"])
+
+# Živá data z kolektoru (lokální socket), spustí se při prvním dotazu na /live
+live_feed = None
+live_feed_lock = threading.Lock()
+
+
+def parse_time_arg(value):
+    """Parametr času: unix timestamp nebo "YYYY-MM-DD HH:MM:SS" """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        timestamps, valid = parse_local_times(np.array([value.strip()]))
+        if not valid[0]:
+            raise ValueError(f"Invalid time: {value!r}")
+        return float(timestamps[0])
+
+
+def cached_by_log(view):
+    """ETag/Last-Modified from the log's inode, size and mtime.
+
+    A poll that finds the log unchanged gets 304 without reading it. The
+    ETag is weak because the body may be compressed differently.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return view(*args, **kwargs)
+        etag = f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+        last_modified = datetime.fromtimestamp(int(st.st_mtime), timezone.utc)
+
+        if request.if_none_match:
+            unchanged = request.if_none_match.contains_weak(etag)
+        else:
+            unchanged = request.if_modified_since is not None and request.if_modified_since >= last_modified
+        # Chybové cesty vrací (jsonify(...), 400) - z n-tice udělej Response
+        response = Response(status=304) if unchanged else make_response(view(*args, **kwargs))
+
+        if response.status_code in (200, 304):
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            # Prohlížeč se musí pokaždé zeptat, odpověď 304 je levná
+            response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
 @app.route("/")
 def index():
-    return render_template("csv_graph.html")
+    return render_template("csv_graph.html", assets=asset_urls())
+
+def point_lists(times, values):
+    labels = format_local_times(times).tolist()
+    return dict(labels=labels, times=times.tolist(), values=values.tolist())
+
+
+def points_response(times, values, **meta):
+    """JSON, or the compact binary payload with ?format=bin"""
+    if request.args.get("format") == "bin":
+        with SERIALIZE_SECONDS.time(format="bin"):
+            return Response(encode_points(meta, times, values), mimetype=MIMETYPE)
+    with SERIALIZE_SECONDS.time(format="json"):
+        return jsonify(**meta, **point_lists(times, values))
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def compress(response):
+    # gzip/brotli/zstd podle Accept-Encoding prohlížeče
+    response = compress_response(response, request.accept_encodings)
+    if "request_start" in g and request.endpoint != "metrics":
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                endpoint=request.endpoint or "none", status=response.status_code)
+    return response
+
 
 @app.route("/data")
+@cached_by_log
 def data():
-    labels = []  # axis X – time
-    values = []  # axis Y – pressure
+    since = request.args.get("since")
+    if since:
+        return data_since(since)
+
+    try:
+        start = parse_time_arg(request.args.get("start"))
+        end = parse_time_arg(request.args.get("end"))
+        max_points = request.args.get("max_points", DEFAULT_MAX_POINTS, type=int)
+        # Méně bodů by obešlo limit velikosti odpovědi (a LTTB potřebuje aspoň 3)
+        if max_points < 3:
+            raise ValueError(f"max_points must be at least 3, got {max_points}")
+        method = request.args.get("method", "lttb")
+        if method not in ("lttb", "minmax"):
+            raise ValueError(f"Unknown downsampling method {method!r}")
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
 
     try:
-        with open(filename, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
+        if start is not None or end is not None:
+            # Časový výřez přes index - čte se jen potřebná část logu, z uzavřených
+            # segmentů (manifest) se rozbalí jen ty, které výřez překrývají
+            times, values, _ = open_series(filename).query(start, end)
+            in_range = len(times)
+            extra = {}
+        else:
+            times, values, generation = cache.get(filename).snapshot()
+            in_range = len(times)
+            extra = dict(total=in_range, cursor=f"{generation}:{in_range}")
 
-            for row in reader:
-                labels.append(row["time"])
-                values.append(float(row["pressure"]))
-        return jsonify(labels=labels, values=values)
+        if len(times) > max_points:
+            times, values = downsample(times, values, max_points, method)
 
+        return points_response(times, values, in_range=in_range, reset=True, **extra)
+
+    except Exception as e:
+        print(f"Chyba při čtení CSV: {e}")
+        return jsonify(error=str(e)), 500
+
+def data_since(since):
+    """Jen řádky přidané od pozice `since` (kurzor z předchozí odpovědi)"""
+    try:
+        since_generation, since_rows = since.rsplit(":", 1)
+        since_rows = int(since_rows)
+    except ValueError:
+        return jsonify(error=f"Invalid cursor {since!r}"), 400
+
+    try:
+        times, values, generation = cache.get(filename).snapshot()
+        total = len(times)
+        # Při rotaci/zkrácení souboru klient zahodí data a začne znovu
+        reset = generation != since_generation or since_rows > total
+        if not reset:
+            times = times[since_rows:]
+            values = values[since_rows:]
+        return points_response(times, values, cursor=f"{generation}:{total}", reset=reset)
+    except Exception as e:
+        print(f"Chyba při čtení CSV: {e}")
+        return jsonify(error=str(e)), 500
+
+
+@app.route("/stats")
+@cached_by_log
+def stats():
+    """Klouzavé statistiky a dP/dt logu, počítané průběžně z nových řádků"""
+    try:
+        log = cache.get(filename)
+        return jsonify(**log.stats_summary())
     except Exception as e:
         print(f"Chyba při čtení CSV: {e}")
         return jsonify(error=str(e)), 500
 
+
+@app.route("/live")
+def live():
+    """Vzorky z kolektoru novější než `since` (pořadové číslo z minulé odpovědi)"""
+    global live_feed
+    with live_feed_lock:
+        if live_feed is None:
+            live_feed = BusFeed().start()
+
+    since = request.args.get("since", -1, type=int)
+    seq, times, values, complete = live_feed.since(since)
+    return points_response(times, values, seq=seq, connected=live_feed.connected, reset=not complete)
+
+
+@app.route("/metrics")
+def metrics():
+    """Časy a čítače serveru ve formátu Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Web graph of the SPCe pressure log")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to serve the whole network")
+    parser.add_argument("--port", type=int, default=5008)
+    parser.add_argument("--threads", type=int, default=8, help="worker threads (production server)")
+    parser.add_argument("--dev", action="store_true", help="Flask development server with debugger and reloader")
+    args = parser.parse_args()
+
+    if args.dev:
+        app.run(host=args.host, port=args.port, debug=True)
+        return
+    try:
+        from waitress import serve
+    except ImportError:
+        parser.error("the production server needs waitress (pip install waitress), or run with --dev")
+    # Jeden proces s vlákny - cache logu a živý socket sdílí všichni diváci
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5008, debug=True)
\ No newline at end of file
+    main()
@@ -0,0 +1,121 @@
+"""Compact binary point payload and response compression for web_graph.
+
+Binary payload (little endian, `?format=bin`):
+
+    "SPCP" | uint32 meta bytes | uint32 count | float64 t0 (epoch s)
+    meta   JSON object with the other response fields, padded with spaces to 4 bytes
+    count x int32   time delta to the previous point in ms (the first one from t0)
+    count x float32 pressure
+
+Compared with the JSON lists (time label, epoch and value per point) it
+takes 8 bytes per point before compression. A gap longer than int32 ms
+(about 24.8 days, e.g. a log resumed after a shutdown) does not fit a
+delta; such payloads start with "SPCF" and carry count x float64 seconds
+from t0 instead of the deltas.
+"""
+import gzip
+import json
+import struct
+
+import numpy as np
+
+from metrics import histogram
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b"SPCP"
+MAGIC_FLOAT_TIMES = b"SPCF"
+HEADER = struct.Struct("<4sIId")
+MIMETYPE = "application/x-spce-points"
+
+# Menší odpovědi nemá smysl komprimovat
+MIN_COMPRESS_BYTES = 512
+
+COMPRESS_SECONDS = histogram("web_compress_seconds", "Compressing one response body", ["encoding"])
+
+
+def encode_points(meta: dict, times, values) -> bytes:
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    t0 = float(times[0]) if len(times) else 0.0
+    ms = np.round((times - t0) * 1000.0).astype(np.int64)
+    deltas = np.diff(ms, prepend=0)
+    if len(deltas) and (deltas.max() > np.iinfo(np.int32).max or deltas.min() < np.iinfo(np.int32).min):
+        magic, time_bytes = MAGIC_FLOAT_TIMES, (times - t0).astype("<f8").tobytes()
+    else:
+        magic, time_bytes = MAGIC, deltas.astype("<i4").tobytes()
+
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    meta_bytes += b" " * (-len(meta_bytes) % 4)
+    return b"".join([HEADER.pack(magic, len(meta_bytes), len(times), t0), meta_bytes,
+                     time_bytes, values.astype("<f4").tobytes()])
+
+
+def decode_points(data: bytes):
+    """Inverse of encode_points, returns (meta, times, values)"""
+    magic, meta_len, n, t0 = HEADER.unpack_from(data)
+    if magic not in (MAGIC, MAGIC_FLOAT_TIMES):
+        raise ValueError("Not a point payload")
+    offset = HEADER.size
+    meta = json.loads(data[offset:offset + meta_len])
+    offset += meta_len
+    if magic == MAGIC_FLOAT_TIMES:
+        times = t0 + np.frombuffer(data, dtype="<f8", count=n, offset=offset)
+        offset += 8 * n
+    else:
+        deltas = np.frombuffer(data, dtype="<i4", count=n, offset=offset)
+        times = t0 + np.cumsum(deltas, dtype=np.int64) / 1000.0
+        offset += 4 * n
+    values = np.frombuffer(data, dtype="<f4", count=n, offset=offset)
+    return meta, times, values.astype(np.float64)
+
+
+def available_encodings():
+    """Content codings we can produce, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def compress_response(response, accept_encodings):
+    """Compress a Flask response with the best coding the client accepts.
+
+    `accept_encodings` is request.accept_encodings (honours q-values).
+    """
+    response.vary.add("Accept-Encoding")
+    if (response.direct_passthrough or response.status_code != 200
+            or "Content-Encoding" in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    encoding = accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+    with COMPRESS_SECONDS.time(encoding=encoding):
+        data = compress(data, encoding)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response